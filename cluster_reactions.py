@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+
+# Define functions
+def canonical_reaction(reaction):
+    # Scale stoichiometry so that the first metabolite has coefficient -1
+    stoichiometry = reaction_stoichiometry(reaction)
+    if not stoichiometry:
+        return (None, 0)
+    metabolites = sorted(stoichiometry)
+    factor = -1 / stoichiometry[metabolites[0]]
+    key = tuple([
+        (m, round(stoichiometry[m] * factor, 6)) for m in metabolites
+    ])
+    # Direction of the reaction relative to its canonical form
+    direction = 1 if factor > 0 else -1
+    return (key, direction)
+
+def test_canonical_reaction():
+    reactions = [
+        "[c](2) C00027 = (2) C00001 + C00007",
+        "[c]C00007 + (2) C00001 = (2) C00027",
+        "C00027[c] = C00001[c] + (0.5) C00007[c]",
+        "C00084[e] = C00084[c]",
+        ""
+    ]
+    key = (("C00001[c]", -1.0), ("C00007[c]", -0.5), ("C00027[c]", 1.0))
+    expected = [
+        (key, -1), (key, 1), (key, -1),
+        ((("C00084[c]", -1.0), ("C00084[e]", 1.0)), -1),
+        (None, 0)
+    ]
+    for reaction, exp_result in zip(reactions, expected):
+        assert canonical_reaction(reaction) == exp_result
+
+
+def find(parent, x):
+    # Find root of x with path compression
+    root = x
+    while parent[root] != root:
+        root = parent[root]
+    while parent[x] != root:
+        parent[x], x = root, parent[x]
+    return root
+
+def union(parent, x, y):
+    root_x = find(parent, x)
+    root_y = find(parent, y)
+    if root_x != root_y:
+        parent[root_y] = root_x
+
+def cluster_reactions(model_reactions):
+    # Group equivalent reactions across models through their canonical form
+    parent = {}
+    directions = {}
+    first_by_key = {}
+    for model, reactions in model_reactions:
+        for rxn_id in reactions:
+            key, direction = canonical_reaction(reactions[rxn_id])
+            if key is None:
+                continue
+            element = (model, rxn_id)
+            parent[element] = element
+            directions[element] = direction
+            try:
+                union(parent, first_by_key[key], element)
+            except KeyError:
+                first_by_key[key] = element
+
+    # Number clusters in order of first appearance; the first reaction of a
+    # cluster is its representative
+    cluster_ids = {}
+    cluster_table = []
+    for element in parent:
+        root = find(parent, element)
+        if root not in cluster_ids:
+            cluster_ids[root] = len(cluster_ids) + 1
+        cluster_table.append((
+            cluster_ids[root], element[0], element[1],
+            directions[element] * directions[root]
+        ))
+    return sorted(cluster_table, key = lambda x: x[0])
+
+def test_cluster_reactions():
+    model_reactions = [
+        ("m1", {
+            "R1" : "[c]C00002 + C00001 = C00008 + C00009",
+            "R2" : "[c]C00092 = C00085",
+            "R3" : ""
+        }),
+        ("m2", {
+            "A" : "[c]C00008 + C00009 = C00002 + C00001",
+            "B" : "C00092[c] = C00085[c]",
+            "C" : "[c]C00149 + C00003 = C00011 + C00004 + C00022"
+        }),
+        ("m3", {
+            "X" : "[c](2) C00002 + (2) C00001 = (2) C00008 + (2) C00009",
+            "Y" : "[c]C00085 = C00092"
+        })
+    ]
+    exp_cluster_table = [
+        (1, "m1", "R1", 1), (1, "m2", "A", -1), (1, "m3", "X", 1),
+        (2, "m1", "R2", 1), (2, "m2", "B", 1), (2, "m3", "Y", -1),
+        (3, "m2", "C", 1)
+    ]
+    assert cluster_reactions(model_reactions) == exp_cluster_table
+
+
+# Main code block
+
+def main(infiles, single, outfile_name):
+    # Read reactions from all NET model infiles
+    model_reactions = [
+        (infile, read_net_reactions(open_file(infile, 'r').readlines(), single))
+        for infile in infiles
+    ]
+
+    # Write cluster table
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join(["Cluster", "Model", "ID", "Direction"]) + "\n")
+        for row in cluster_reactions(model_reactions):
+            outfile.write("\t".join([str(x) for x in row]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model infiles
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read NET model infiles.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-s', '--single', action='store_true',
+        help='Single compartment reactions only.'
+    )
+
+    # Output: Tab-delimited file with reaction clusters
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write reaction clusters to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.infiles, args.single, args.outfile)
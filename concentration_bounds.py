@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import io
+import os
+import re
+import sys
+
+import numpy as np
+
+from netaid_io import open_file
+
+# Concentration units of the replicate tables relative to M
+global unit_factors
+unit_factors = {"M" : 1.0, "mM" : 1e-3, "uM" : 1e-6, "nM" : 1e-9}
+
+# Define functions
+def read_replicate_chunks(f, columns, chunk_size):
+    # Groups (KEGG ID, condition) and values of a replicate table, read in
+    # chunks of lines; rows without a positive numeric value are counted
+    header = f.readline().rstrip("\r\n").split("\t")
+    try:
+        indices = [header.index(x) for x in columns]
+    except ValueError:
+        sys.exit(
+            "Error: Replicate table lacks columns: " + \
+            ", ".join([x for x in columns if x not in header])
+        )
+    while True:
+        groups = []
+        values = []
+        skipped = 0
+        for line in f:
+            fields = line.rstrip("\r\n").split("\t")
+            try:
+                value = float(fields[indices[2]])
+            except (IndexError, ValueError):
+                value = np.nan
+            if not value > 0:
+                skipped += 1
+            else:
+                groups.append((fields[indices[0]], fields[indices[1]]))
+                values.append(value)
+            if len(groups) + skipped == chunk_size:
+                break
+        if not groups and not skipped:
+            return
+        yield (groups, np.array(values), skipped)
+
+def new_accumulator(keep_values):
+    # Running count, mean, sum of squared deviations, minimum and maximum
+    # of each group; the values themselves are only kept for percentiles
+    return {
+        "groups" : {}, "n" : np.zeros(0), "mean" : np.zeros(0),
+        "M2" : np.zeros(0), "min" : np.zeros(0), "max" : np.zeros(0),
+        "codes" : [] if keep_values else None, "values" : []
+    }
+
+def accumulate(acc, groups, values):
+    # Add one chunk, with statistics per group from bincounts merged into the
+    # running ones (Chan et al. parallel variance)
+    codes = np.array([
+        acc["groups"].setdefault(x, len(acc["groups"])) for x in groups
+    ], dtype=int)
+    n_groups = len(acc["groups"])
+    grow = n_groups - len(acc["n"])
+    if grow:
+        acc["n"] = np.concatenate([acc["n"], np.zeros(grow)])
+        acc["mean"] = np.concatenate([acc["mean"], np.zeros(grow)])
+        acc["M2"] = np.concatenate([acc["M2"], np.zeros(grow)])
+        acc["min"] = np.concatenate([acc["min"], np.full(grow, np.inf)])
+        acc["max"] = np.concatenate([acc["max"], np.full(grow, -np.inf)])
+    n_chunk = np.bincount(codes, minlength=n_groups).astype(float)
+    present = n_chunk > 0
+    mean_chunk = np.zeros(n_groups)
+    mean_chunk[present] = np.bincount(
+        codes, weights=values, minlength=n_groups
+    )[present] / n_chunk[present]
+    M2_chunk = np.bincount(
+        codes, weights=(values - mean_chunk[codes]) ** 2, minlength=n_groups
+    )
+    n_total = acc["n"] + n_chunk
+    delta = mean_chunk - acc["mean"]
+    acc["mean"][present] += \
+        delta[present] * n_chunk[present] / n_total[present]
+    acc["M2"][present] += M2_chunk[present] + delta[present] ** 2 * \
+        acc["n"][present] * n_chunk[present] / n_total[present]
+    acc["n"] = n_total
+    np.minimum.at(acc["min"], codes, values)
+    np.maximum.at(acc["max"], codes, values)
+    if acc["codes"] is not None:
+        acc["codes"].append(codes)
+        acc["values"].append(values)
+
+def bound_estimates(acc, method, k, percentiles):
+    # Low and high bound (M) of every group: the observed range, the mean
+    # plus or minus k standard deviations with the minimum as lower limit
+    # when the interval reaches zero, or a percentile interval
+    if method == "range":
+        return (acc["min"], acc["max"])
+    if method == "sd":
+        sd = np.sqrt(acc["M2"] / np.maximum(acc["n"] - 1, 1))
+        lo = acc["mean"] - k * sd
+        lo = np.where(lo > 0, lo, acc["min"])
+        return (lo, acc["mean"] + k * sd)
+    codes = np.concatenate(acc["codes"])
+    values = np.concatenate(acc["values"])
+    order = np.lexsort((values, codes))
+    splits = np.cumsum(acc["n"].astype(int))[:-1]
+    lo = []
+    hi = []
+    for group_values in np.split(values[order], splits):
+        group_lo, group_hi = np.percentile(group_values, percentiles)
+        lo.append(group_lo)
+        hi.append(group_hi)
+    return (np.array(lo), np.array(hi))
+
+def test_bound_estimates():
+    lines = [
+        "Sample\tKEGG\tCondition\tValue",
+        "s1\tC00002\tlight\t2", "s2\tC00002\tlight\t4",
+        "s1\tC00008\tlight\tNA", "s3\tC00002\tdark\t1",
+        "s4\tC00002\tlight\t6", "s4\tC00008\tlight\t0.5",
+        "s5\tC00002\tlight\t8"
+    ]
+    for keep_values in (False, True):
+        acc = new_accumulator(keep_values)
+        skipped = 0
+        chunks = read_replicate_chunks(
+            io.StringIO("\n".join(lines) + "\n"),
+            ["KEGG", "Condition", "Value"], 3
+        )
+        for groups, values, chunk_skipped in chunks:
+            accumulate(acc, groups, values)
+            skipped += chunk_skipped
+        assert skipped == 1
+        assert list(acc["groups"]) == [
+            ("C00002", "light"), ("C00002", "dark"), ("C00008", "light")
+        ]
+
+        # Streamed statistics equal those of all values at once
+        assert np.allclose(acc["n"], [4, 1, 1])
+        assert np.allclose(acc["mean"], [5, 1, 0.5])
+        assert np.allclose(acc["M2"], [20, 0, 0])
+        lo, hi = bound_estimates(acc, "range", None, None)
+        assert np.allclose(lo, [2, 1, 0.5]) and np.allclose(hi, [8, 1, 0.5])
+
+    # Two standard deviations reach zero, so the minimum is used
+    lo, hi = bound_estimates(acc, "sd", 2, None)
+    sd = np.std([2, 4, 6, 8], ddof=1)
+    assert np.allclose(lo, [2, 1, 0.5])
+    assert np.allclose(hi, [5 + 2 * sd, 1, 0.5])
+    lo, hi = bound_estimates(acc, "sd", 0.5, None)
+    assert np.isclose(lo[0], 5 - 0.5 * sd)
+    lo, hi = bound_estimates(acc, "percentile", None, [25, 75])
+    assert np.allclose(lo, [3.5, 1, 0.5]) and np.allclose(hi, [6.5, 1, 0.5])
+
+
+def condition_file_name(condition):
+    # Condition labels as safe file names
+    return re.sub("[^A-Za-z0-9._-]", "_", condition) + ".tab"
+
+
+# Main code block
+
+def main(infiles, kegg_column, condition_column, value_column, unit, method,
+         k, percentiles, chunk_size, outdir):
+    acc = new_accumulator(method == "percentile")
+    skipped = 0
+    for infile in infiles:
+        with open_file(infile) as f:
+            chunks = read_replicate_chunks(
+                f, [kegg_column, condition_column, value_column], chunk_size
+            )
+            for groups, values, chunk_skipped in chunks:
+                accumulate(acc, groups, values * unit_factors[unit])
+                skipped += chunk_skipped
+    if skipped:
+        print(
+            "Skipped " + str(skipped) + " rows without a positive value.",
+            file=sys.stderr
+        )
+
+    lo, hi = bound_estimates(acc, method, k, percentiles)
+
+    # Write one concentrations file per condition, sorted by KEGG ID
+    conditions = {}
+    for (kegg_id, condition), i in acc["groups"].items():
+        conditions.setdefault(condition, []).append((kegg_id, i))
+    os.makedirs(outdir, exist_ok=True)
+    for condition in sorted(conditions):
+        outfile_name = os.path.join(outdir, condition_file_name(condition))
+        with open_file(outfile_name, 'w') as outfile:
+            outfile.write("\t".join(["KEGG.ID", "low_M", "high_M"]) + "\n")
+            for kegg_id, i in sorted(conditions[condition]):
+                outfile.write("\t".join(
+                    [kegg_id, "%.15g" % lo[i], "%.15g" % hi[i]]
+                ) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: Replicate measurement tables
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read tab-delimited replicate tables with a header.'
+    )
+    parser.add_argument(
+        '-k', '--kegg', default='KEGG.ID',
+        help='Column with KEGG IDs [KEGG.ID].'
+    )
+    parser.add_argument(
+        '-c', '--condition', default='Condition',
+        help='Column with conditions [Condition].'
+    )
+    parser.add_argument(
+        '-v', '--value', default='Concentration',
+        help='Column with measured concentrations [Concentration].'
+    )
+    parser.add_argument(
+        '-u', '--unit', default='M', choices=list(unit_factors),
+        help='Unit of measured concentrations [M].'
+    )
+
+    # Options
+    parser.add_argument(
+        '-m', '--method', default='range',
+        choices=['range', 'sd', 'percentile'],
+        help='Bounds from the observed range, mean +/- k SD or percentiles ' + \
+        '[range].'
+    )
+    parser.add_argument(
+        '-s', '--sd', type=float, default=2.0,
+        help='Number of standard deviations k for the sd method [2].'
+    )
+    parser.add_argument(
+        '-p', '--percentiles', type=float, nargs=2, default=[2.5, 97.5],
+        help='Percentiles for the percentile method [2.5 97.5].'
+    )
+    parser.add_argument(
+        '-n', '--chunk_size', type=int, default=100000,
+        help='Rows per processed chunk [100000].'
+    )
+
+    # Output: Concentrations files
+    parser.add_argument(
+        '-o', '--outdir', required=True,
+        help='Write one concentrations file per condition to this directory.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.infiles, args.kegg, args.condition, args.value, args.unit,
+        args.method, args.sd, args.percentiles, args.chunk_size, args.outdir
+    )
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+from fractions import Fraction
+from math import gcd
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+
+# Define functions
+def reaction_rows(reactions):
+    # Sparse rows of the transposed stoichiometric matrix with exact integer
+    # coefficients; the biomass reaction is left out
+    species_index = {}
+    rows = []
+    for rxn_id in reactions:
+        if rxn_id == "Biomass" or not reactions[rxn_id]:
+            continue
+        row = {}
+        stoichiometry = reaction_stoichiometry(reactions[rxn_id])
+        for metabolite in stoichiometry:
+            if metabolite not in species_index:
+                species_index[metabolite] = len(species_index)
+            row[species_index[metabolite]] = \
+                Fraction(repr(stoichiometry[metabolite]))
+        # Clear denominators, so that elimination stays in integers
+        scale = 1
+        for v in row.values():
+            scale = scale * v.denominator // gcd(scale, v.denominator)
+        rows.append(dict([(k, int(v * scale)) for k, v in row.items()]))
+    species = sorted(species_index, key = lambda x: species_index[x])
+    return (species, rows)
+
+def reduce_row(row):
+    # Divide a row by the greatest common divisor of its entries
+    divisor = 0
+    for v in row.values():
+        divisor = gcd(divisor, v)
+    if divisor > 1:
+        row = dict([(k, v // divisor) for k, v in row.items()])
+    return row
+
+def left_null_space(rows, n_columns):
+    # Reduced row echelon form of the sparse rows by fraction-free integer
+    # elimination, choosing the shortest row as pivot to limit fill-in
+    column_rows = {}
+    for i, row in enumerate(rows):
+        for j in row:
+            column_rows.setdefault(j, set()).add(i)
+    pivots = {}
+    pivot_rows = set()
+    for j in range(n_columns):
+        candidates = [
+            i for i in column_rows.get(j, set()) if i not in pivot_rows
+        ]
+        if not candidates:
+            continue
+        p = min(candidates, key = lambda i: (len(rows[i]), i))
+        pivot_value = rows[p][j]
+        for i in list(column_rows[j]):
+            if i == p:
+                continue
+            factor = rows[i][j]
+            row = dict([(k, v * pivot_value) for k, v in rows[i].items()])
+            for k, v in rows[p].items():
+                value = row.get(k, 0) - factor * v
+                if value:
+                    row[k] = value
+                    column_rows.setdefault(k, set()).add(i)
+                else:
+                    row.pop(k, None)
+                    column_rows[k].discard(i)
+            rows[i] = reduce_row(row)
+        pivots[j] = p
+        pivot_rows.add(p)
+
+    # One basis vector per free column, scaled to coprime integers
+    basis = []
+    for free in range(n_columns):
+        if free in pivots:
+            continue
+        vector = {free : Fraction(1)}
+        for j, p in pivots.items():
+            if free in rows[p]:
+                vector[j] = Fraction(-rows[p][free], rows[p][j])
+        scale = 1
+        for v in vector.values():
+            scale = scale * v.denominator // gcd(scale, v.denominator)
+        vector = reduce_row(
+            dict([(k, int(v * scale)) for k, v in vector.items()])
+        )
+        # Prefer mostly positive vectors
+        if sum(vector.values()) < 0:
+            vector = dict([(k, -v) for k, v in vector.items()])
+        basis.append(vector)
+    return basis
+
+def test_left_null_space():
+    reactions = {
+        "HEX1" : "[c]C00002 + C00031 = C00008 + C00092",
+        "PYK" : "[c]C00008 + C00074 = C00002 + C00022",
+        "ADK1" : "[c]C00002 + C00020 = (2) C00008",
+        "Biomass" : "C00002 = C00008"
+    }
+    species, rows = reaction_rows(reactions)
+    basis = left_null_space(rows, len(species))
+
+    # Seven metabolites in three independent reactions leave four moieties
+    moieties = [moiety_expression(vector, species) for vector in basis]
+    assert len(moieties) == 4
+    assert "C00002[c] + C00008[c] + C00020[c]" in moieties
+    assert "C00031[c] + C00092[c]" in moieties
+
+    # Every basis vector is orthogonal to every reaction
+    species, rows = reaction_rows(reactions)
+    for vector in basis:
+        for row in rows:
+            assert sum([v * vector.get(k, 0) for k, v in row.items()]) == 0
+
+
+def moiety_expression(vector, species):
+    # NET formatted linear combination, e.g. (2) C00002[c] + C00008[c]
+    terms = []
+    for k in sorted(vector, key = lambda k: species[k]):
+        if vector[k] == 1:
+            terms.append(species[k])
+        else:
+            terms.append("(" + str(vector[k]) + ") " + species[k])
+    return " + ".join(terms)
+
+def test_moiety_expression():
+    species = ["C00002[c]", "C00008[c]", "C00020[c]"]
+    assert moiety_expression({2 : 1, 0 : 2, 1 : 1}, species) == \
+        "(2) C00002[c] + C00008[c] + C00020[c]"
+
+
+# Main code block
+
+def main(model, outfile_name, sums, bounds):
+    reactions = read_net_reactions(open_file(model).readlines(), False)
+    species, rows = reaction_rows(reactions)
+    basis = left_null_space(rows, len(species))
+    basis = sorted(basis, key = lambda x: moiety_expression(x, species))
+
+    # Write conserved moieties with their sign pattern
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join(["Moiety", "Nonnegative", "Combination"]) + "\n")
+        for i, vector in enumerate(basis):
+            nonnegative = min(vector.values()) >= 0
+            outfile.write("\t".join([
+                str(i + 1), str(int(nonnegative)),
+                moiety_expression(vector, species)
+            ]) + "\n")
+
+    # Write nonnegative moieties as sum lines for the ratios file
+    if sums:
+        with open_file(sums, 'w') as outfile:
+            for vector in basis:
+                if min(vector.values()) < 0 or len(vector) < 2:
+                    continue
+                outfile.write(";".join([
+                    moiety_expression(vector, species),
+                    str(bounds[0]), str(bounds[1]), "", "", ""
+                ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model
+    parser.add_argument(
+        'model',
+        help='Read NET model file.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-b', '--bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Bounds (mM) written for each sum line [0.0001 10].'
+    )
+
+    # Output: Conserved moieties, sum lines
+    parser.add_argument(
+        '-s', '--sums',
+        help='Write nonnegative moieties as sum lines for the ratios file.'
+    )
+    parser.add_argument(
+        'outfile',
+        help='Write tab-delimited conserved moieties to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.model, args.outfile, args.sums, args.bounds)
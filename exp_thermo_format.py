@@ -4,20 +4,25 @@
 import argparse
 import re
 
+from netaid_io import open_file
+from thermo_format import cc_columns
+
 # Define functions
 def format_thermo_lines(thermo_lines):
 
     # Create dictionary by metabolite
     thermo_lines_dict = {}
+    columns = cc_columns("")
     for line in thermo_lines:
         line = line.strip()
-        if line.endswith("nan"):
-            # Skip lines without a formation delta G
-            continue
         if line.startswith("Compound ID"):
-            # Skip header line
+            # Read column positions from header line
+            columns = cc_columns(line)
             continue
-        metabolite = line.split(",")[0]
+        if line.split(",")[columns["dG0_f"]] == "nan":
+            # Skip lines without a formation delta G
+            continue
+        metabolite = line.split(",")[columns["Compound ID"]]
         try:
             thermo_lines_dict[metabolite].append(line)
         except KeyError:
@@ -29,10 +34,15 @@ def format_thermo_lines(thermo_lines):
         met_section = [metabolite + ";;;;;;"]
         for met_line in thermo_lines_dict[metabolite]:
             met_line = met_line.split(",")
-            dfG = met_line[3]
-            chrg = met_line[2]
-            nH = met_line[1]
-            met_section.append(";".join(["", dfG, "NaN", chrg, nH, "", ""]))
+            dfG = met_line[columns["dG0_f"]]
+            chrg = met_line[columns["charge"]]
+            nH = met_line[columns["nH"]]
+            if columns["dG0_f_std"] is None or \
+                met_line[columns["dG0_f_std"]] in ("", "nan"):
+                std = "NaN"
+            else:
+                std = met_line[columns["dG0_f_std"]]
+            met_section.append(";".join(["", dfG, std, chrg, nH, "", ""]))
         net_thermo_lines[metabolite] = "\n".join(met_section) + "\n"
 
     return net_thermo_lines
@@ -233,34 +243,44 @@ def test_format_concentrations():
     exp_conc_text.split("\n")
 
 
-# Main code block
+def format_experimental(ther_dict, meta_dict, conc_text, rats_list, flux_list):
 
-def main(model, thermo, conc, ratios, fluxes, experimental, out_thermo):
-
-    # Read input files
-    ther_dict = format_thermo_lines(open(thermo).readlines())
-    meta_dict = net_model_to_metabolite_dict(open(model).read())
-    conc_text = format_concentrations(open(conc).read(), meta_dict)
-    rats_list = [x.strip() for x in open(ratios).readlines()]
-    flux_list = [x.strip().split("\t") for x in open(fluxes).readlines()]
-
-    # Generate output text
+    # Generate experimental data text
     x_out = []
-    x_out.append(conc_text.strip())
+    x_out.append(format_concentrations(conc_text, meta_dict).strip())
     x_out.extend(["metabolite;" + x for x in rats_list])
     x_out.append("")
     x_out.append(";ID;direction;")
     x_out.extend([";".join(["flux"] + x) for x in flux_list])
     x_out = "\n".join(x_out + [""])
 
+    # Generate model-specific thermodynamics text
     metabolites = filter(lambda x: x in ther_dict, sorted(meta_dict))
     t_out = "".join([ther_dict[m] for m in metabolites])
 
+    return (x_out, t_out)
+
+# Main code block
+
+def main(model, thermo, conc, ratios, fluxes, experimental, out_thermo):
+
+    # Read input files
+    ther_dict = format_thermo_lines(open_file(thermo).readlines())
+    meta_dict = net_model_to_metabolite_dict(open_file(model).read())
+    conc_text = open_file(conc).read()
+    rats_list = [x.strip() for x in open_file(ratios).readlines()]
+    flux_list = [x.strip().split("\t") for x in open_file(fluxes).readlines()]
+
+    # Generate output text
+    x_out, t_out = format_experimental(
+        ther_dict, meta_dict, conc_text, rats_list, flux_list
+    )
+
     # Write output to files
-    with open(experimental, 'w') as x:
+    with open_file(experimental, 'w') as x:
         x.write(x_out)
 
-    with open(out_thermo, 'w') as t:
+    with open_file(out_thermo, 'w') as t:
         t.write(t_out)
 
 
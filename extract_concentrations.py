@@ -5,11 +5,35 @@ import argparse
 import re
 import os
 
+from netaid_io import open_file
+
 # Specify path to repository
 global repo_dir
 repo_dir = os.path.dirname(__file__)
 
 # Define functions
+def concentration_record(line, net_kegg_dict, kegg_name_dict, label):
+    # Parse one metabolite concentration line; None if it is not wanted
+    line = line.split(";")
+    ID = re.sub("\[.*\]", "", line[0])
+    try:
+        kegg_id = net_kegg_dict[ID]
+    except KeyError:
+        try:
+            kegg_name = kegg_name_dict[ID]
+            kegg_id = ID
+        except KeyError:
+            return None
+    try:
+        kegg_name = kegg_name_dict[kegg_id]
+    except KeyError:
+        kegg_name = "NA"
+    try:
+        compartment = re.findall("\[.*\]", line[0])[0].strip("[]")
+    except IndexError:
+        compartment = "NA"
+    return [label, ID, kegg_name, compartment, kegg_id, *line[2:6]]
+
 def extract_concentrations(net_output_text, net_kegg_dict, kegg_name_dict, label):
     # Parse metabolite concentration lines
     return_lines = [
@@ -26,27 +50,11 @@ def extract_concentrations(net_output_text, net_kegg_dict, kegg_name_dict, label
             break
         if store_lines and line and not line.startswith("Metabolite;"):
             # This is a line that we want
-            line = line.split(";")
-            ID = re.sub("\[.*\]", "", line[0])
-            try:
-                kegg_id = net_kegg_dict[ID]
-            except KeyError:
-                try:
-                    kegg_name = kegg_name_dict[ID]
-                    kegg_id = ID
-                except KeyError:
-                    continue
-            try:
-                kegg_name = kegg_name_dict[kegg_id]
-            except KeyError:
-                kegg_name = "NA"
-            try:
-                compartment = re.findall("\[.*\]", line[0])[0].strip("[]")
-            except IndexError:
-                compartment = "NA"
-            return_lines.append([
-                label, ID, kegg_name, compartment, kegg_id, *line[2:6]
-            ])
+            record = concentration_record(
+                line, net_kegg_dict, kegg_name_dict, label
+            )
+            if record:
+                return_lines.append(record)
     return "\n".join(["\t".join(L) for L in return_lines])
 
 def test_extract_concentrations():
@@ -84,21 +92,29 @@ def test_extract_concentrations():
     X = extract_concentrations(net_output_text, net_kegg_dict, kegg_name_dict, "Test")
     assert X.split("\n") == exp_extract.split("\n")
 
-# Main code block
-
-def main(infile, names, label, outfile_name):
-    kegg_name_dict = dict([
+def read_kegg_name_dict(kegg_names):
+    return dict([
         x.strip().split(";")[0].split("\t") for x in \
-        open(os.path.join(repo_dir, "data/keggid_keggname.tab")).readlines()
+        open_file(kegg_names).readlines()
     ])
+
+def read_net_kegg_dict(names):
     if names:
-        net_kegg_dict = dict([
-            x.strip().split("\t") for x in open(names).readlines()
+        return dict([
+            x.strip().split("\t") for x in open_file(names).readlines()
         ])
     else:
-        net_kegg_dict = {}
-    net_output_text = open(infile).read()
-    with open(outfile_name, 'w') as outfile:
+        return {}
+
+# Main code block
+
+def main(infile, names, label, outfile_name):
+    kegg_name_dict = read_kegg_name_dict(
+        os.path.join(repo_dir, "data/keggid_keggname.tab")
+    )
+    net_kegg_dict = read_net_kegg_dict(names)
+    net_output_text = open_file(infile).read()
+    with open_file(outfile_name, 'w') as outfile:
         output = extract_concentrations(
             net_output_text, net_kegg_dict, kegg_name_dict, label
         )
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import re
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+
+# Define functions
+def adjacency_index(reactions):
+    # Metabolite-to-reaction and reaction-to-metabolite index
+    metabolite_reactions = {}
+    reaction_metabolites = {}
+    for rxn_id in reactions:
+        if rxn_id == "Biomass" or not reactions[rxn_id]:
+            continue
+        reaction_metabolites[rxn_id] = set(
+            reaction_stoichiometry(reactions[rxn_id])
+        )
+        for metabolite in reaction_metabolites[rxn_id]:
+            try:
+                metabolite_reactions[metabolite].add(rxn_id)
+            except KeyError:
+                metabolite_reactions[metabolite] = {rxn_id}
+    return (metabolite_reactions, reaction_metabolites)
+
+def neighbourhood(seed_metabolites, seed_reactions, metabolite_reactions,
+                  reaction_metabolites, steps, max_degree):
+    # Breadth-first search from the seeds, taking one reaction layer per step
+    # and not walking through currency metabolites above the degree cutoff
+    selected = set(seed_reactions) & set(reaction_metabolites)
+    visited = set()
+    frontier = set(seed_metabolites)
+    for rxn_id in selected:
+        frontier.update(reaction_metabolites[rxn_id])
+    for step in range(steps):
+        next_frontier = set()
+        for metabolite in frontier - visited:
+            visited.add(metabolite)
+            adjacent = metabolite_reactions.get(metabolite, set())
+            if len(adjacent) > max_degree:
+                continue
+            for rxn_id in adjacent - selected:
+                selected.add(rxn_id)
+                next_frontier.update(reaction_metabolites[rxn_id])
+        frontier = next_frontier
+    return selected
+
+def test_neighbourhood():
+    reactions = {
+        "HEX1" : "[c]C00002 + C00031 = C00008 + C00092",
+        "PGI" : "[c]C00092 = C00085",
+        "PFK" : "[c]C00002 + C00085 = C00008 + C00354",
+        "FBA" : "[c]C00354 = C00111 + C00118",
+        "TPI" : "[c]C00111 = C00118",
+        "ATPM" : "[c]C00002 + C00001 = C00008 + C00009",
+        "GLCt" : "C00031[e] = C00031[c]",
+        "Biomass" : "C00002 = C00008"
+    }
+    metabolite_reactions, reaction_metabolites = adjacency_index(reactions)
+    assert metabolite_reactions["C00002[c]"] == {"HEX1", "PFK", "ATPM"}
+    assert "Biomass" not in reaction_metabolites
+
+    # One step from glucose 6-phosphate, ATP is currency
+    assert neighbourhood(
+        {"C00092[c]"}, set(), metabolite_reactions, reaction_metabolites, 1, 2
+    ) == {"HEX1", "PGI"}
+
+    # Two steps do not pass through ATP or ADP
+    assert neighbourhood(
+        {"C00092[c]"}, set(), metabolite_reactions, reaction_metabolites, 2, 2
+    ) == {"HEX1", "PGI", "PFK", "GLCt"}
+
+    # Seed reactions contribute their metabolites to the first step
+    assert neighbourhood(
+        set(), {"TPI"}, metabolite_reactions, reaction_metabolites, 1, 2
+    ) == {"TPI", "FBA"}
+
+
+def filter_net_model(net_model_text, keep_reactions):
+    # Keep reaction lines in the set, and metabolite lines still in use
+    lines = []
+    kept_metabolites = set()
+    for line in net_model_text.split("\n"):
+        if line.startswith(";Biomass Reaction") and \
+            "Biomass" not in keep_reactions:
+            # Drop the biomass header together with its leading empty line
+            if lines and not lines[-1]:
+                lines.pop()
+            continue
+        if line.startswith("reaction;"):
+            if line.split(";")[1] not in keep_reactions:
+                continue
+            kept_metabolites.update(re.findall("C[0-9]{5}", line.split(";")[2]))
+        lines.append(line)
+    return "\n".join([
+        line for line in lines if not line.startswith("metabolite;") or \
+        line.split(";")[1] in kept_metabolites
+    ])
+
+def test_filter_net_model():
+    net_model_text = "\n".join([
+        ";ID;pH;IS;Potential mV;Volume;",
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "",
+        ";Model;;;;;",
+        "",
+        ";Abbreviation;reactions;;;;",
+        "reaction;ATPM;[c]C00002 + C00001 = C00008 + C00009;;;;",
+        "reaction;PGI;[c]C00092 = C00085;;;;",
+        "",
+        "",
+        "Thermo names;;",
+        "",
+        ";Metabolite (don't change);Name in model",
+        "metabolite;C00001;C00001",
+        "metabolite;C00002;C00002",
+        "metabolite;C00085;C00085",
+        "metabolite;C00092;C00092",
+        ""
+    ])
+    exp_net_model_text = "\n".join([
+        ";ID;pH;IS;Potential mV;Volume;",
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "",
+        ";Model;;;;;",
+        "",
+        ";Abbreviation;reactions;;;;",
+        "reaction;PGI;[c]C00092 = C00085;;;;",
+        "",
+        "",
+        "Thermo names;;",
+        "",
+        ";Metabolite (don't change);Name in model",
+        "metabolite;C00085;C00085",
+        "metabolite;C00092;C00092",
+        ""
+    ])
+    assert filter_net_model(net_model_text, {"PGI"}) == exp_net_model_text
+
+
+# Main code block
+
+def main(model, conc, fluxes, steps, max_degree, outfile_name):
+    net_model_text = open_file(model).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    metabolite_reactions, reaction_metabolites = adjacency_index(reactions)
+
+    # Seed metabolites are measured KEGG IDs in any compartment
+    seed_metabolites = set()
+    if conc:
+        measured = set([
+            x.split("\t")[0] for x in open_file(conc).readlines()
+            if x.strip() and not x.startswith("KEGG")
+        ])
+        seed_metabolites = set([
+            m for m in metabolite_reactions if m.split("[")[0] in measured
+        ])
+    seed_reactions = set()
+    if fluxes:
+        seed_reactions = set(filter(
+            None, [x.split("\t")[0].strip() for x in open_file(fluxes).readlines()]
+        ))
+
+    selected = neighbourhood(
+        seed_metabolites, seed_reactions, metabolite_reactions,
+        reaction_metabolites, steps, max_degree
+    )
+
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write(filter_net_model(net_model_text, selected))
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, measured concentrations, fluxes
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-c', '--concentrations',
+        help='Read concentrations file with measured KEGG IDs.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with reactions to include.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-k', '--steps', type=int, default=1,
+        help='Number of reaction layers around the data [1].'
+    )
+    parser.add_argument(
+        '-d', '--max_degree', type=int, default=20,
+        help='Do not walk through metabolites in more reactions [20].'
+    )
+
+    # Output: NET-compatible model text file
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write NET-formatted submodel text file.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.concentrations, args.fluxes, args.steps,
+        args.max_degree, args.outfile
+    )
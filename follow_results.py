@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from extract_concentrations import concentration_record, read_kegg_name_dict, \
+    read_net_kegg_dict
+from netaid_io import open_file
+
+# Specify path to repository
+global repo_dir
+repo_dir = os.path.dirname(__file__)
+
+# Define functions
+def new_state():
+    # Position in a followed NET output file and what has been seen so far
+    return {
+        "offset" : 0, "section" : None, "subsection" : "", "elapsed" : None,
+        "log_lines" : 0, "records" : 0, "finished" : False, "complete" : False
+    }
+
+def read_new_lines(path, state):
+    # Complete lines appended since the last offset; a partly written last
+    # line is left for the next poll
+    size = os.stat(path).st_size
+    if size < state["offset"]:
+        # File was rewritten; start over
+        state.clear()
+        state.update(new_state())
+    if size == state["offset"]:
+        return []
+    with open(path, 'rb') as f:
+        f.seek(state["offset"])
+        data = f.read(size - state["offset"])
+    end = data.rfind(b"\n") + 1
+    state["offset"] += end
+    return data[:end].decode("utf-8", errors="replace").split("\n")[:-1]
+
+def process_lines(lines, state, label, net_kegg_dict, kegg_name_dict):
+    # Update the state with new lines; return concentration records and
+    # progress messages
+    records = []
+    messages = []
+    for line in lines:
+        line = line.rstrip("\r")
+        if re.match("^[A-Z]{2,}[A-Za-z ]*$", line.strip()):
+            state["section"] = line.strip()
+            messages.append(label + ": " + state["section"])
+            if state["section"] == "SHADOW PRICES of DELTArG":
+                state["finished"] = True
+            continue
+        if not line.strip():
+            continue
+        if state["section"] == "GENERAL INFORMATIONS":
+            fields = line.split(";")
+            if fields[0] and len(fields) > 1 and not fields[1]:
+                state["subsection"] = fields[0]
+            elif (state["subsection"], fields[0]) == \
+                ("Informations on NET", "Time elapsed"):
+                state["elapsed"] = fields[1]
+                messages.append(label + ": time elapsed " + fields[1])
+        elif state["section"] == "CONCENTRATIONS":
+            if line.startswith("Metabolite;"):
+                continue
+            record = concentration_record(
+                line, net_kegg_dict, kegg_name_dict, label
+            )
+            if record:
+                records.append(record)
+                state["records"] += 1
+        elif state["section"] == "LOG":
+            state["log_lines"] += 1
+            if line.lstrip().startswith("- ") and \
+                len(line) - len(line.lstrip()) <= 2:
+                # Top-level steps only
+                messages.append(label + ": " + line.strip()[2:].rstrip(";"))
+    return (records, messages)
+
+def test_process_lines():
+    kegg_name_dict = {"C00092" : "D-Glucose 6-phosphate"}
+    net_kegg_dict = {"g6p" : "C00092"}
+    chunks = [
+        "GENERAL INFORMATIONS\n\nInformations on NET;;\nTime elap",
+        "sed;00:21:50;\n;;\n\nCONCENTRATIONS\n\n",
+        "Metabolite;DfG'0;Range Min;Range Max;Optim Min;Optim Max;\n",
+        "g6p[c];-1318.92;0.0001;0.528;0.337486;0.5279;\n",
+        "LOG\n\n  - parse reactions from model.csv;\n",
+        "    - transporter found;\n\nSHADOW PRICES of DELTArG\n"
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.csv")
+        state = new_state()
+        records = []
+        messages = []
+        for chunk in chunks:
+            with open(path, 'a') as f:
+                f.write(chunk)
+            r, m = process_lines(
+                read_new_lines(path, state), state, "run",
+                net_kegg_dict, kegg_name_dict
+            )
+            records.extend(r)
+            messages.extend(m)
+
+            # Only complete lines are consumed
+            assert state["offset"] == open(path).read().rfind("\n") + 1
+    assert records == [[
+        "run", "g6p", "D-Glucose 6-phosphate", "c", "C00092",
+        "0.0001", "0.528", "0.337486", "0.5279"
+    ]]
+    assert messages == [
+        "run: GENERAL INFORMATIONS", "run: time elapsed 00:21:50",
+        "run: CONCENTRATIONS", "run: LOG",
+        "run: parse reactions from model.csv", "run: SHADOW PRICES of DELTArG"
+    ]
+    assert state["finished"] and state["log_lines"] == 2
+
+
+def run_ended(path, state, timeout, now):
+    # A file is done after the last section, or when it has not been written
+    # for timeout seconds, as runs that stop early never reach that section
+    if state["finished"]:
+        return True
+    return timeout > 0 and now - os.stat(path).st_mtime > timeout
+
+def test_run_ended():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.csv")
+        open(path, 'w').write("LOG\n")
+        os.utime(path, (1000, 1000))
+        state = new_state()
+        assert not run_ended(path, state, 600, 1500)
+        assert run_ended(path, state, 600, 1700)
+        assert not run_ended(path, state, 0, 1700)
+        state["finished"] = True
+        assert run_ended(path, state, 600, 1500)
+
+
+def followed_files(paths, pattern):
+    # Files given directly, and files in directories matching the pattern
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted([
+                os.path.join(path, x) for x in os.listdir(path)
+                if fnmatch.fnmatch(x, pattern)
+            ]))
+        elif os.path.exists(path):
+            files.append(path)
+    return [os.path.abspath(x) for x in files]
+
+def paths_open(paths):
+    # Directories may receive new runs, so keep following them
+    return any([os.path.isdir(path) for path in paths])
+
+def write_checkpoint(checkpoint, states):
+    # Replace the checkpoint file in one step
+    directory = os.path.dirname(os.path.abspath(checkpoint))
+    with tempfile.NamedTemporaryFile(
+        'w', dir=directory, delete=False, suffix=".tmp"
+        ) as f:
+        json.dump(states, f)
+    os.replace(f.name, checkpoint)
+
+
+# Main code block
+
+def main(paths, pattern, names, checkpoint, interval, timeout, once,
+         outfile_name):
+    kegg_name_dict = read_kegg_name_dict(
+        os.path.join(repo_dir, "data/keggid_keggname.tab")
+    )
+    net_kegg_dict = read_net_kegg_dict(names)
+
+    # Resume from the checkpoint
+    states = {}
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            states = json.load(f)
+
+    # Append records; write the header to a new outfile
+    write_header = outfile_name == "-" or not os.path.exists(outfile_name) or \
+        os.path.getsize(outfile_name) == 0
+    outfile = open_file(outfile_name, 'a' if outfile_name != "-" else 'w')
+    if write_header:
+        outfile.write("\t".join([
+            "Label", "ID", "Name", "Compartment", "KEGGID",
+            "LowIn", "HighIn", "LowOut", "HighOut"
+        ]) + "\n")
+
+    try:
+        while True:
+            changed = False
+            files = followed_files(paths, pattern)
+            for path in files:
+                state = states.setdefault(path, new_state())
+                if state["complete"]:
+                    continue
+                label = os.path.basename(path).split(".")[0]
+                lines = read_new_lines(path, state)
+                if not lines:
+                    # A finished or stalled file that stopped growing is
+                    # complete
+                    if run_ended(path, state, timeout, time.time()):
+                        state["complete"] = True
+                        changed = True
+                        print(
+                            label + ": " + ("complete" if state["finished"] \
+                            else "stalled") + ", " + str(state["records"]) + \
+                            " records", file=sys.stderr
+                        )
+                    continue
+                records, messages = process_lines(
+                    lines, state, label, net_kegg_dict, kegg_name_dict
+                )
+                outfile.write("".join(["\t".join(x) + "\n" for x in records]))
+                for message in messages:
+                    print(message, file=sys.stderr)
+                changed = True
+            if changed:
+                outfile.flush()
+                if checkpoint:
+                    write_checkpoint(checkpoint, states)
+            if once or (files and not paths_open(paths) and all([
+                states[path]["complete"] for path in files
+                ])):
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        outfile.close()
+        if checkpoint:
+            write_checkpoint(checkpoint, states)
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET output files or directories, metabolite names
+    parser.add_argument(
+        'paths', nargs='+',
+        help='Follow NET output files or directories with NET output files.'
+    )
+    parser.add_argument(
+        '-g', '--pattern', default='*.csv',
+        help='File name pattern in directories [*.csv].'
+    )
+    parser.add_argument(
+        '-n', '--names',
+        help='Read metabolite names-to-KEGG ID translation.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-c', '--checkpoint',
+        help='Read and write file offsets to this JSON file.'
+    )
+    parser.add_argument(
+        '-s', '--interval', type=float, default=2.0,
+        help='Seconds between polls [2].'
+    )
+    parser.add_argument(
+        '-t', '--timeout', type=float, default=3600.0,
+        help='Seconds without writes after which an unfinished run is ' + \
+        'complete; 0 waits for the last section [3600].'
+    )
+    parser.add_argument(
+        '-1', '--once', action='store_true',
+        help='Process the new lines once and exit.'
+    )
+
+    # Output: Tab-delimited concentration records
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Append concentration ranges to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.paths, args.pattern, args.names, args.checkpoint, args.interval,
+        args.timeout, args.once, args.outfile
+    )
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+from netaid_io import open_file
+
+# Specify path to repository
+global repo_dir
+repo_dir = os.path.dirname(__file__)
+
+# Database layout; one row per run, metabolite range and reaction range
+global schema
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE, label TEXT, version TEXT, date TEXT,
+    model TEXT, data TEXT, thermo TEXT, solver TEXT, elapsed_s INTEGER,
+    original_metabolites INTEGER, original_reactions INTEGER,
+    reduced_metabolites INTEGER, reduced_reactions INTEGER,
+    sums INTEGER, ratios INTEGER
+);
+CREATE TABLE IF NOT EXISTS concentrations (
+    run_id INTEGER REFERENCES runs(run_id),
+    metabolite TEXT, compartment TEXT, dfg REAL,
+    range_min REAL, range_max REAL, optim_min REAL, optim_max REAL
+);
+CREATE TABLE IF NOT EXISTS reactions (
+    run_id INTEGER REFERENCES runs(run_id),
+    reaction TEXT, extended TEXT, model_dir INTEGER, data_dir INTEGER,
+    partial_data INTEGER, rhs REAL, drg_min REAL, drg_max REAL
+);
+CREATE INDEX IF NOT EXISTS concentrations_metabolite
+    ON concentrations (metabolite, compartment);
+CREATE INDEX IF NOT EXISTS concentrations_run ON concentrations (run_id);
+CREATE INDEX IF NOT EXISTS reactions_reaction ON reactions (reaction);
+CREATE INDEX IF NOT EXISTS reactions_data_dir ON reactions (data_dir);
+CREATE INDEX IF NOT EXISTS reactions_run ON reactions (run_id);
+"""
+
+# Define functions
+def net_output_sections(net_output_text):
+    # Split NET output into its upper case sections
+    sections = {}
+    section = None
+    for line in net_output_text.split("\n"):
+        if re.match("^[A-Z]{2,}[A-Za-z ]*$", line.strip()):
+            section = line.strip()
+            sections[section] = []
+            continue
+        if section and line.strip():
+            sections[section].append(line.rstrip("\n"))
+    return sections
+
+def to_number(value, number_type=float):
+    # Empty and NaN values are stored as NULL
+    if value in ("", "NaN", "nan"):
+        return None
+    return number_type(value)
+
+def parse_general_information(lines):
+    # Read key-value pairs, keeping track of the sub-headers
+    general = {}
+    subsection = ""
+    for line in lines:
+        line = line.split(";")
+        if len(line) < 2 or not line[0]:
+            continue
+        if not line[1]:
+            subsection = line[0]
+            continue
+        general[(subsection, line[0])] = line[1]
+    elapsed = general.get(("Informations on NET", "Time elapsed"))
+    if elapsed:
+        elapsed = sum([
+            int(x) * 60 ** i for i, x in enumerate(reversed(elapsed.split(":")))
+        ])
+    info = dict([
+        (column, general.get(("Informations on NET", key)))
+        for column, key in [
+            ("version", "Version"), ("date", "Date"), ("model", "Model"),
+            ("data", "Data"), ("thermo", "Thermo"), ("solver", "Solver")
+        ]
+    ])
+    info["elapsed_s"] = elapsed
+    for column, key in [
+        ("original_metabolites", ("Original size", "Metabolites")),
+        ("original_reactions", ("Original size", "Reactions")),
+        ("reduced_metabolites", ("Reduced model", "Metabolites")),
+        ("reduced_reactions", ("Reduced model", "Reactions")),
+        ("sums", ("Reduced model", "Sums")),
+        ("ratios", ("Reduced model", "Ratios"))
+        ]:
+        info[column] = to_number(general.get(key, ""), int)
+    return info
+
+def test_parse_general_information():
+    sections = net_output_sections(
+        open(os.path.join(repo_dir, "data/example_net.csv")).read()
+    )
+    assert list(sections) == [
+        "GENERAL INFORMATIONS", "CONCENTRATIONS", "THERMODYNAMIC DATA", "LOG",
+        "SHADOW PRICES of CONCENTRATIONS", "SHADOW PRICES of DELTArG"
+    ]
+    assert parse_general_information(sections["GENERAL INFORMATIONS"]) == {
+        "version" : "anNET 1.1.06", "date" : "15-Sep-2016 14:52:36",
+        "model" : "/ssd/common/tools/anNET/1.1.06/Ecoli_JR904.csv",
+        "data" : "/ssd/common/tools/anNET/1.1.06/Schaub.csv",
+        "thermo" : "/ssd/common/tools/anNET/1.1.06/Alberty_ext.csv",
+        "solver" : "fmincon", "elapsed_s" : 1310,
+        "original_metabolites" : 762, "original_reactions" : 923,
+        "reduced_metabolites" : 144, "reduced_reactions" : 163,
+        "sums" : 4, "ratios" : 3
+    }
+
+
+def parse_concentrations(lines):
+    rows = []
+    for line in lines:
+        if line.startswith("Metabolite;"):
+            continue
+        line = line.split(";")
+        compartment = re.findall("\[(.+?)\]$", line[0])
+        if compartment and " " not in line[0]:
+            metabolite = line[0][:line[0].rindex("[")]
+            compartment = compartment[0]
+        else:
+            # Sums and ratios have no single compartment
+            metabolite = line[0]
+            compartment = None
+        rows.append(tuple(
+            [metabolite, compartment] + [to_number(x) for x in line[1:6]]
+        ))
+    return rows
+
+def parse_thermodynamic_data(lines):
+    rows = []
+    for line in lines:
+        if line.startswith("Reaction;"):
+            continue
+        line = line.split(";")
+        rows.append(tuple(
+            line[0:2] + [to_number(x, int) for x in line[2:5]] + \
+            [to_number(x) for x in line[5:8]]
+        ))
+    return rows
+
+def test_parse_sections():
+    concentration_lines = [
+        "Metabolite;DfG'0;Range Min;Range Max;Optim Min;Optim Max;",
+        "g6p + f6p;;0.432;0.528;0.432;0.528;",
+        "g6p[c];-1318.92;0.0001;0.528;0.337486;0.5279;"
+    ]
+    assert parse_concentrations(concentration_lines) == [
+        ("g6p + f6p", None, None, 0.432, 0.528, 0.432, 0.528),
+        ("g6p", "c", -1318.92, 0.0001, 0.528, 0.337486, 0.5279)
+    ]
+    thermodynamic_lines = [
+        "Reaction;Extended;Model dir;Data dir;Partial data;RHS;delta r G Min;delta r G Max;",
+        "LEUTAi;[c]4mop + glu-L --> akg + leu-L;1;1;0;0;NaN;NaN;"
+    ]
+    assert parse_thermodynamic_data(thermodynamic_lines) == [
+        ("LEUTAi", "[c]4mop + glu-L --> akg + leu-L", 1, 1, 0, 0.0, None, None)
+    ]
+
+
+def ingest(connection, path, label, net_output_text):
+    # Replace any earlier version of the run and insert all its records
+    sections = net_output_sections(net_output_text)
+    info = parse_general_information(sections.get("GENERAL INFORMATIONS", []))
+    info["path"] = os.path.abspath(path) if path != "-" else path
+    info["label"] = label
+    cursor = connection.cursor()
+    old = cursor.execute(
+        "SELECT run_id FROM runs WHERE path = ?", (info["path"],)
+    ).fetchone()
+    if old:
+        for table in ("concentrations", "reactions", "runs"):
+            cursor.execute("DELETE FROM %s WHERE run_id = ?" % table, old)
+    columns = sorted(info)
+    cursor.execute(
+        "INSERT INTO runs (%s) VALUES (%s)" % (
+            ", ".join(columns), ", ".join(["?"] * len(columns))
+        ), [info[c] for c in columns]
+    )
+    run_id = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO concentrations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(run_id,) + row for row in parse_concentrations(
+            sections.get("CONCENTRATIONS", [])
+        )]
+    )
+    cursor.executemany(
+        "INSERT INTO reactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(run_id,) + row for row in parse_thermodynamic_data(
+            sections.get("THERMODYNAMIC DATA", [])
+        )]
+    )
+    return run_id
+
+def test_ingest():
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(schema)
+    net_output_text = open(os.path.join(repo_dir, "data/example_net.csv")).read()
+    ingest(connection, "example_net.csv", "Test", net_output_text)
+    ingest(connection, "example_net.csv", "Test", net_output_text)
+    assert connection.execute("SELECT COUNT(*) FROM runs").fetchone() == (1,)
+    assert connection.execute(
+        "SELECT r.label, c.optim_min, c.optim_max FROM concentrations c "
+        "JOIN runs r USING (run_id) "
+        "WHERE c.metabolite = 'g6p' AND c.compartment = 'c'"
+    ).fetchall() == [("Test", 0.337486, 0.5279)]
+    assert connection.execute(
+        "SELECT COUNT(*) FROM reactions WHERE data_dir != 0"
+    ).fetchone()[0] > 0
+
+
+# Main code block
+
+def main(database, infiles, labels, query):
+    connection = sqlite3.connect(database)
+    connection.executescript(schema)
+
+    # Ingest all NET output files in one transaction
+    if infiles:
+        labels = labels or [
+            os.path.basename(x).split(".")[0] for x in infiles
+        ]
+        if len(labels) != len(infiles):
+            sys.exit("Error: Number of labels does not match number of files.")
+        with connection:
+            for infile, label in zip(infiles, labels):
+                ingest(connection, infile, label, open_file(infile).read())
+
+    # Write query results as tab-delimited text
+    if query:
+        cursor = connection.execute(query)
+        print("\t".join([x[0] for x in cursor.description]))
+        for row in cursor:
+            print("\t".join(["NA" if x is None else str(x) for x in row]))
+
+    connection.close()
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Database
+    parser.add_argument(
+        '-d', '--database', required=True,
+        help='SQLite database with NET results.'
+    )
+
+    # Input: NET output files
+    parser.add_argument(
+        'infiles', nargs='*',
+        help='Read NET output files into the database.'
+    )
+    parser.add_argument(
+        '-l', '--labels', nargs='+',
+        help='Labels for the runs [file names].'
+    )
+
+    # Output: Query results
+    parser.add_argument(
+        '-q', '--query',
+        help='Run SQL query and write tab-delimited results to stdout.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.database, args.infiles, args.labels, args.query)
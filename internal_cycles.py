@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+from collections import Counter
+from fractions import Fraction
+from math import gcd
+
+import numpy as np
+from scipy import sparse
+
+from conserved_moieties import left_null_space, moiety_expression, reduce_row
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+
+# Define functions
+def internal_reactions(reactions):
+    # Reactions with both substrates and products; exchange reactions and
+    # the biomass reaction can not be part of an internal cycle
+    internal = {}
+    for rxn_id in reactions:
+        if rxn_id == "Biomass" or not reactions[rxn_id]:
+            continue
+        stoichiometry = reaction_stoichiometry(reactions[rxn_id])
+        coefficients = stoichiometry.values()
+        if min(coefficients, default=0) < 0 < max(coefficients, default=0):
+            internal[rxn_id] = stoichiometry
+    return internal
+
+def species_rows(internal, reaction_ids):
+    # Sparse integer rows of the internal stoichiometric matrix, one per
+    # species, over the reaction columns
+    rows = {}
+    for j, rxn_id in enumerate(reaction_ids):
+        for species, coefficient in internal[rxn_id].items():
+            rows.setdefault(species, {})[j] = Fraction(repr(coefficient))
+    integer_rows = []
+    for species in sorted(rows):
+        scale = 1
+        for v in rows[species].values():
+            scale = scale * v.denominator // gcd(scale, v.denominator)
+        integer_rows.append(dict([
+            (k, int(v * scale)) for k, v in rows[species].items()
+        ]))
+    return integer_rows
+
+def combine(x, y):
+    # Combination of vector x with vector y that cancels the reactions
+    # sharing the most common coefficient ratio
+    ratios = Counter()
+    for r in x.keys() & y.keys():
+        a, b = y[r], x[r]
+        divisor = gcd(a, b) * (1 if a > 0 else -1)
+        ratios[(a // divisor, b // divisor)] += 1
+    (a, b), count = ratios.most_common(1)[0]
+    combination = {}
+    for r in x.keys() | y.keys():
+        v = a * x.get(r, 0) - b * y.get(r, 0)
+        if v:
+            combination[r] = v
+    combination = reduce_row(combination)
+    if sum(combination.values()) < 0:
+        combination = dict([(r, -v) for r, v in combination.items()])
+    return combination
+
+def scaled_row(x, n_columns):
+    # Dense vector of x with a largest absolute coefficient of one
+    scale = max([abs(v) for v in x.values()], default=1)
+    row = np.zeros(n_columns)
+    for r, v in x.items():
+        row[r] = v / scale
+    return row
+
+def sparsify(basis, max_passes=10):
+    # Replace basis vectors by combinations with other basis vectors that
+    # have a smaller support, for at most max_passes passes. A combination
+    # cancels at most the shared reactions, so vector j can only shorten
+    # vector i if they share more than half of j; such vectors are found
+    # through an index of the vectors by reaction. The sizes of the
+    # combinations with them are found at once: the ratios of their
+    # coefficients on the support of i are sorted per vector, and the longest
+    # run of equal ratios is the number of cancelled reactions. The ratios
+    # come from vectors scaled to a largest coefficient of one, so they only
+    # pick the partner; the exact combination must be smaller
+    basis = [dict(x) for x in basis]
+    n_columns = 1 + max([max(x) for x in basis if x], default=-1)
+    B = np.zeros((len(basis), n_columns))
+    index = {}
+    for i, x in enumerate(basis):
+        B[i] = scaled_row(x, n_columns)
+        for r in x:
+            index.setdefault(r, set()).add(i)
+    lengths = np.count_nonzero(B, axis=1)
+    for n_pass in range(max_passes):
+        improved = False
+        for i in range(len(basis)):
+            while basis[i]:
+                shared = Counter([
+                    j for r in basis[i] for j in index[r] if j != i
+                ])
+                candidates = np.array([
+                    j for j, n_shared in shared.items()
+                    if 2 * n_shared > lengths[j]
+                ], dtype=int)
+                if not len(candidates):
+                    break
+                support = np.flatnonzero(B[i])
+                values = B[np.ix_(candidates, support)]
+                with np.errstate(invalid='ignore'):
+                    ratios = np.sort(
+                        np.where(values != 0, values, np.nan) / B[i, support],
+                        axis=1
+                    )
+                same = np.abs(ratios[:, 1:] - ratios[:, :-1]) <= \
+                    1e-9 * np.abs(ratios[:, 1:])
+                equal = np.cumsum(same, axis=1)
+                runs = equal - np.maximum.accumulate(
+                    np.where(same, 0, equal), axis=1
+                )
+                counts = np.max(runs, axis=1, initial=0) + 1
+                sizes = lengths[i] + lengths[candidates] - \
+                    np.array([shared[j] for j in candidates]) - counts
+                k = int(np.argmin(sizes))
+                if sizes[k] >= lengths[i]:
+                    break
+                combination = combine(basis[i], basis[candidates[k]])
+                if len(combination) >= lengths[i]:
+                    break
+                for r in basis[i]:
+                    index[r].discard(i)
+                for r in combination:
+                    index.setdefault(r, set()).add(i)
+                basis[i] = combination
+                B[i] = scaled_row(combination, n_columns)
+                lengths[i] = len(combination)
+                improved = True
+        if not improved:
+            break
+    return basis
+
+def cycle_status(vector, reaction_ids, directions):
+    # A cycle is open if it can run one way with all given flux directions
+    forward = all([
+        directions.get(reaction_ids[k], 0) * v >= 0 for k, v in vector.items()
+    ])
+    backward = all([
+        directions.get(reaction_ids[k], 0) * v <= 0 for k, v in vector.items()
+    ])
+    if forward and backward:
+        return "open"
+    if forward:
+        return "forward"
+    if backward:
+        return "backward"
+    return "blocked"
+
+def internal_cycles(reactions, directions, max_passes=10):
+    # Exact null space basis of the internal stoichiometric matrix, sorted
+    # from the smallest cycle
+    internal = internal_reactions(reactions)
+    reaction_ids = sorted(internal)
+    basis = sparsify(left_null_space(
+        species_rows(internal, reaction_ids), len(reaction_ids)
+    ), max_passes)
+    cycles = []
+    for vector in basis:
+        cycles.append((
+            len(vector), moiety_expression(vector, reaction_ids),
+            cycle_status(vector, reaction_ids, directions),
+            [reaction_ids[k] for k in sorted(vector)]
+        ))
+    return sorted(cycles)
+
+def test_internal_cycles():
+    reactions = {
+        "PGI" : "[c]C00092 = C00085",
+        "DUP" : "[c]C00085 = C00092",
+        "A1" : "[c]C00022 = C00024",
+        "A2" : "[c]C00024 = C00033",
+        "A3" : "[c]C00033 = C00022",
+        "AT" : "[c](2) C00022 = (2) C00033",
+        "EX" : "[c]C00022 = ",
+        "Biomass" : "C00024 = C00033"
+    }
+    cycles = internal_cycles(reactions, {"A1" : 1, "A3" : -1, "DUP" : 1})
+    assert cycles == [
+        (2, "(2) A3 + AT", "backward", ["A3", "AT"]),
+        (2, "DUP + PGI", "forward", ["DUP", "PGI"]),
+        (3, "(2) A1 + (2) A2 + (-1) AT", "forward", ["A1", "A2", "AT"])
+    ]
+    assert internal_cycles(reactions, {})[0][2] == "open"
+
+    # A1 + A2 + A3 is a loop, but A1 forward and A3 backward block it
+    assert cycle_status(
+        {0 : 1, 1 : 1, 2 : 1}, ["A1", "A2", "A3"], {"A1" : 1, "A3" : -1}
+    ) == "blocked"
+
+
+# Main code block
+
+def main(model, fluxes, experimental, max_passes, outfile_name):
+    reactions = read_net_reactions(open_file(model).readlines(), False)
+
+    # Known flux directions
+    directions = {}
+    if experimental:
+        for line in open_file(experimental).read().split("\n"):
+            if line.startswith("flux;"):
+                directions[line.split(";")[1]] = int(float(line.split(";")[2]))
+    if fluxes:
+        for line in open_file(fluxes).read().split("\n"):
+            if line.strip():
+                line = line.strip().split("\t")
+                directions[line[0]] = int(float(line[1]))
+
+    cycles = internal_cycles(reactions, directions, max_passes)
+
+    # Write cycles with their size and whether the directions allow them
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join(
+            ["Cycle", "Size", "Status", "Fixed", "Combination"]
+        ) + "\n")
+        for i, (size, expression, status, members) in enumerate(cycles):
+            fixed = [
+                x + ":" + str(directions[x]) for x in members
+                if directions.get(x, 0)
+            ]
+            outfile.write("\t".join([
+                str(i + 1), str(size), status, ",".join(fixed) or "NA",
+                expression
+            ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, flux directions
+    parser.add_argument(
+        'model',
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with directions.'
+    )
+    parser.add_argument(
+        '-x', '--experimental',
+        help='Read flux directions from experimental data file.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-p', '--passes', type=int, default=10,
+        help='Maximum number of passes that shorten the cycles [10].'
+    )
+
+    # Output: Internal cycles
+    parser.add_argument(
+        'outfile',
+        help='Write tab-delimited internal cycles to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.fluxes, args.experimental, args.passes, args.outfile
+    )
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import re
+
+from cluster_reactions import find, union
+from extract_subnetwork import filter_net_model
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+
+# Define functions
+def degree_index(stoichiometries):
+    # Reactions of every species on either side, as NET reactions are
+    # reversible
+    index = {}
+    for rxn_id in stoichiometries:
+        for species in stoichiometries[rxn_id]:
+            index.setdefault(species, []).append(rxn_id)
+    return index
+
+def linear_intermediates(stoichiometries, protected):
+    # Species in exactly two reactions, on any side
+    index = degree_index(stoichiometries)
+    return dict([
+        (species, tuple(index[species])) for species in index
+        if species not in protected and len(index[species]) == 2
+    ])
+
+def lump_chains(stoichiometries, protected):
+    # Join reactions linked by linear intermediates and sum each chain,
+    # scaling every step so that the intermediate cancels; a negative scale
+    # runs a reaction backwards when the intermediate is on the same side
+    intermediates = linear_intermediates(stoichiometries, protected)
+    parent = dict([(rxn_id, rxn_id) for rxn_id in stoichiometries])
+    links = {}
+    for species, (producer, consumer) in intermediates.items():
+        union(parent, producer, consumer)
+        links.setdefault(producer, []).append((species, consumer))
+        links.setdefault(consumer, []).append((species, producer))
+    chains = {}
+    for rxn_id in stoichiometries:
+        if rxn_id in links:
+            chains.setdefault(find(parent, rxn_id), []).append(rxn_id)
+
+    lumps = []
+    for members in chains.values():
+        start = members[0]
+        lumped = dict(stoichiometries[start])
+        scales = {start : 1.0}
+        queue = [start]
+        while queue:
+            rxn_id = queue.pop(0)
+            for species, other in links[rxn_id]:
+                if other in scales:
+                    continue
+                scales[other] = \
+                    -lumped[species] / stoichiometries[other][species]
+                for s, c in stoichiometries[other].items():
+                    lumped[s] = lumped.get(s, 0) + scales[other] * c
+                queue.append(other)
+        lumped = dict([
+            (s, round(c, 6)) for s, c in lumped.items() if abs(c) > 1e-9
+        ])
+
+        # Branched or cyclic groups do not cancel; keep those reactions
+        if not lumped or any([
+            s in lumped for s in intermediates
+            if intermediates[s][0] in scales
+            ]):
+            continue
+        lumps.append((sorted(members), scales, lumped))
+    return sorted(lumps)
+
+def format_equation(stoichiometry):
+    # NET equation from a stoichiometry, with a leading tag when possible
+    def term(species, coefficient, tag):
+        name = species.split("[")[0] if tag else species
+        coefficient = abs(coefficient)
+        if coefficient == 1:
+            return name
+        if coefficient == int(coefficient):
+            coefficient = int(coefficient)
+        return "(" + str(coefficient) + ") " + name
+    compartments = set([s.rstrip("]").split("[")[1] for s in stoichiometry])
+    tag = len(compartments) == 1
+    species = sorted(stoichiometry)
+    equation = " + ".join([
+        term(s, stoichiometry[s], tag) for s in species if stoichiometry[s] < 0
+    ]) + " = " + " + ".join([
+        term(s, stoichiometry[s], tag) for s in species if stoichiometry[s] > 0
+    ])
+    if tag:
+        equation = "[" + compartments.pop() + "]" + equation
+    return equation
+
+def test_lump_chains():
+    reactions = {
+        "R1" : "[c]C00002 + C00031 = C00008 + C00092",
+        "R2" : "[c]C00092 = C00085",
+        "R3" : "[c]C00085 = (2) C00111",
+        "R4" : "[c]C00111 = C00118",
+        "R5" : "[c]C00118 + C00003 = C00004",
+        "R6" : "[c]C00118 = C00022"
+    }
+    stoichiometries = dict([
+        (k, reaction_stoichiometry(v)) for k, v in reactions.items()
+    ])
+
+    # C00118 has two consumers, so the chain ends at R4
+    lumps = lump_chains(stoichiometries, set())
+    assert len(lumps) == 1
+    members, scales, lumped = lumps[0]
+    assert members == ["R1", "R2", "R3", "R4"]
+    assert scales == {"R1" : 1.0, "R2" : 1.0, "R3" : 1.0, "R4" : 2.0}
+    assert format_equation(lumped) == \
+        "[c]C00002 + C00031 = C00008 + (2) C00118"
+
+    # Protected metabolites split chains
+    lumps = lump_chains(stoichiometries, {"C00085[c]"})
+    assert [x[0] for x in lumps] == [["R1", "R2"], ["R3", "R4"]]
+
+    # An intermediate on the product side of both reactions reverses one
+    lumps = lump_chains(dict([(k, reaction_stoichiometry(v)) for k, v in {
+        "R1" : "[c]C00031 = C00092",
+        "R2" : "[c]C00085 = C00092"
+    }.items()]), set())
+    assert lumps == [(
+        ["R1", "R2"], {"R1" : 1.0, "R2" : -1.0},
+        {"C00031[c]" : -1, "C00085[c]" : 1}
+    )]
+
+    # Mixed compartments keep their tags
+    assert format_equation({"C00031[e]" : -1, "C00092[c]" : 0.5}) == \
+        "C00031[e] = (0.5) C00092[c]"
+
+def lump_ids(n, existing):
+    # The first n IDs LUMP1, LUMP2, ... that are not model reaction IDs
+    ids = []
+    i = 1
+    while len(ids) < n:
+        if "LUMP" + str(i) not in existing:
+            ids.append("LUMP" + str(i))
+        i += 1
+    return ids
+
+def test_lump_ids():
+    assert lump_ids(2, set()) == ["LUMP1", "LUMP2"]
+    assert lump_ids(2, {"LUMP1", "LUMP3"}) == ["LUMP2", "LUMP4"]
+
+
+# Main code block
+
+def main(model, conc, fluxes, mapping, outfile_name):
+    net_model_text = open_file(model).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+
+    # Keep measured metabolites, biomass metabolites and given reactions
+    protected_ids = set()
+    if conc:
+        protected_ids.update([
+            x.split("\t")[0] for x in open_file(conc).readlines()
+            if x.strip() and not x.startswith("KEGG")
+        ])
+    if "Biomass" in reactions:
+        protected_ids.update(re.findall("C[0-9]{5}", reactions["Biomass"]))
+    fixed_reactions = set(["Biomass"])
+    if fluxes:
+        fixed_reactions.update(filter(
+            None, [x.split("\t")[0].strip() for x in open_file(fluxes).readlines()]
+        ))
+    stoichiometries = dict([
+        (rxn_id, reaction_stoichiometry(reactions[rxn_id]))
+        for rxn_id in reactions if reactions[rxn_id]
+    ])
+    protected = set()
+    for rxn_id in stoichiometries:
+        for species in stoichiometries[rxn_id]:
+            if rxn_id in fixed_reactions or \
+                species.split("[")[0] in protected_ids:
+                protected.add(species)
+    for rxn_id in fixed_reactions:
+        stoichiometries.pop(rxn_id, None)
+
+    lumps = lump_chains(stoichiometries, protected)
+
+    # Replace chains by lumped reactions, after the last model reaction
+    lumped_ids = set()
+    lump_lines = []
+    new_ids = lump_ids(len(lumps), set(reactions))
+    with open_file(mapping, 'w') as outfile:
+        outfile.write("\t".join(["Lumped", "ID", "Scale"]) + "\n")
+        for lump_id, (members, scales, lumped) in zip(new_ids, lumps):
+            lumped_ids.update(members)
+            lump_lines.append(
+                "reaction;" + lump_id + ";" + format_equation(lumped) + ";;;;"
+            )
+            for rxn_id in members:
+                outfile.write("\t".join(
+                    [lump_id, rxn_id, str(round(scales[rxn_id], 6))]
+                ) + "\n")
+    lines = net_model_text.split("\n")
+    last = max([
+        i for i, line in enumerate(lines)
+        if line.startswith("reaction;") and \
+        not line.startswith("reaction;Biomass;")
+    ] + [-1])
+    lines = lines[:last + 1] + lump_lines + lines[last + 1:]
+    keep = set(reactions) - lumped_ids
+    keep.update(new_ids)
+
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write(filter_net_model("\n".join(lines), keep))
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, measured concentrations, fluxes
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-c', '--concentrations',
+        help='Read concentrations file with measured KEGG IDs to keep.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with reactions to keep.'
+    )
+
+    # Output: Lumped NET model, mapping of lumped reactions
+    parser.add_argument(
+        '-p', '--mapping', required=True,
+        help='Write tab-delimited mapping of lumped to original reactions.'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write NET-formatted lumped model text file.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.concentrations, args.fluxes, args.mapping,
+        args.outfile
+    )
@@ -4,6 +4,10 @@
 import argparse
 import re
 import os
+import random
+import zlib
+
+from netaid_io import open_file
 
 # Specify path to repository
 global repo_dir
@@ -128,35 +132,210 @@ def test_match():
         assert match(pair[0], pair[1]) == pair[2]
         assert match(pair[1], pair[0]) == pair[2]
 
-# Main code block
 
-def main(infile1, infile2, single, outfile_name):
-    # Read reactions from infile 1
-    reactions_1 = {}
-    for line in open(infile1, 'r').readlines():
-        if line.startswith("reaction"):
-            if single and ";[" not in line:
+def reaction_sides(reaction):
+    # Return metabolites with compartment tags for each side of a reaction
+    try:
+        compartment = re.match("^\[.+?\]", reaction).group()
+    except AttributeError:
+        compartment = ""
+    sides = re.split(
+        "(?:^| +)[\=\-\>\<]+(?: +|$)", re.sub("^\[.+?\]", "", reaction.strip())
+    )
+    return tuple(
+        frozenset([
+            x.split(" ")[-1] + compartment for x in side.split(" + ") if x
+        ]) for side in sides
+    )
+
+def test_reaction_sides():
+    assert reaction_sides("[c](2) C00027 = (2) C00001 + C00007") == (
+        frozenset({"C00027[c]"}), frozenset({"C00001[c]", "C00007[c]"})
+    )
+    assert reaction_sides("(0.5) C00007[c] + C00390[c] = C00001[c]") == (
+        frozenset({"C00007[c]", "C00390[c]"}), frozenset({"C00001[c]"})
+    )
+
+
+def reaction_stoichiometry(reaction):
+    # Return net stoichiometric coefficient by metabolite (substrates < 0)
+    try:
+        compartment = re.match("^\[.+?\]", reaction).group()
+    except AttributeError:
+        compartment = ""
+    sides = re.split(
+        "(?:^| +)[\=\-\>\<]+(?: +|$)", re.sub("^\[.+?\]", "", reaction.strip())
+    )
+    stoichiometry = {}
+    for sign, side in zip([-1, 1], sides):
+        for element in [x.split(" ") for x in side.split(" + ") if x]:
+            metabolite = element[-1] + compartment
+            if len(element) > 1:
+                coefficient = float(element[0].strip("()"))
+            else:
+                coefficient = 1.0
+            stoichiometry[metabolite] = \
+                stoichiometry.get(metabolite, 0) + sign * coefficient
+    return dict([x for x in stoichiometry.items() if x[1] != 0])
+
+def test_reaction_stoichiometry():
+    assert reaction_stoichiometry("[c](2) C00027 = (2) C00001 + C00007") == {
+        "C00027[c]" : -2.0, "C00001[c]" : 2.0, "C00007[c]" : 1.0
+    }
+    assert reaction_stoichiometry(
+        "(0.5) C00007[c] + C00390[c] = C00001[c] + C00399[c]"
+    ) == {
+        "C00007[c]" : -0.5, "C00390[c]" : -1.0,
+        "C00001[c]" : 1.0, "C00399[c]" : 1.0
+    }
+    assert reaction_stoichiometry("C00084[e] + C00001[c] = C00084[c] + C00001[c]") == {
+        "C00084[e]" : -1.0, "C00084[c]" : 1.0
+    }
+
+
+def minhash_signature(metabolites, permutations):
+    # Minimum of each universal hash function over the metabolite hashes
+    prime = (1 << 61) - 1
+    hashes = [zlib.crc32(m.encode()) for m in metabolites]
+    return tuple(
+        min([(a * h + b) % prime for h in hashes]) for a, b in permutations
+    )
+
+def minhash_permutations(num_perm, seed=1):
+    prime = (1 << 61) - 1
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(1, prime), rng.randrange(0, prime))
+        for i in range(num_perm)
+    ]
+
+def test_minhash_signature():
+    permutations = minhash_permutations(64)
+    s1 = minhash_signature({"C00002[c]", "C00001[c]", "C00008[c]"}, permutations)
+    s2 = minhash_signature({"C00008[c]", "C00002[c]", "C00001[c]"}, permutations)
+    s3 = minhash_signature({"C00003[c]", "C00004[c]"}, permutations)
+    assert s1 == s2
+    assert len(s1) == 64
+    assert sum([x == y for x, y in zip(s1, s3)]) < 8
+
+
+def approximate_match(reactions_1, reactions_2, threshold, top=1,
+                      num_perm=64, bands=16):
+    # Index reactions 2 in LSH buckets, one bucket per band of the signature
+    permutations = minhash_permutations(num_perm)
+    rows = num_perm // bands
+    sides_2 = {}
+    buckets = {}
+    for rxn_id in reactions_2:
+        if not reactions_2[rxn_id]:
+            continue
+        sides_2[rxn_id] = reaction_sides(reactions_2[rxn_id])
+        signature = minhash_signature(
+            sides_2[rxn_id][0] | sides_2[rxn_id][1], permutations
+        )
+        for b in range(bands):
+            key = (b, signature[b * rows:(b + 1) * rows])
+            try:
+                buckets[key].append(rxn_id)
+            except KeyError:
+                buckets[key] = [rxn_id]
+
+    # Verify candidates from shared buckets with the exact Jaccard index
+    matches = []
+    for rxn_id_1 in reactions_1:
+        if not reactions_1[rxn_id_1]:
+            continue
+        l1, r1 = reaction_sides(reactions_1[rxn_id_1])
+        metabolites_1 = l1 | r1
+        signature = minhash_signature(metabolites_1, permutations)
+        candidates = set()
+        for b in range(bands):
+            candidates.update(
+                buckets.get((b, signature[b * rows:(b + 1) * rows]), [])
+            )
+        scored = []
+        for rxn_id_2 in candidates:
+            l2, r2 = sides_2[rxn_id_2]
+            metabolites_2 = l2 | r2
+            jaccard = len(metabolites_1 & metabolites_2) / \
+                len(metabolites_1 | metabolites_2)
+            if jaccard < threshold:
                 continue
-            line = line.strip().split(";")
-            reactions_1[line[1]] = line[2]
+            # Direction from the overlap of the sides
+            same = len(l1 & l2) + len(r1 & r2)
+            opposite = len(l1 & r2) + len(r1 & l2)
+            direction = 1 if same >= opposite else -1
+            scored.append((jaccard, rxn_id_2, direction))
+        for jaccard, rxn_id_2, direction in sorted(
+            scored, key = lambda x: (-x[0], x[1])
+            )[:top]:
+            matches.append((rxn_id_1, rxn_id_2, direction, jaccard))
+
+    return matches
 
-    # Read reactions from infile 2
-    reactions_2 = {}
-    for line in open(infile2, 'r').readlines():
+def test_approximate_match():
+    reactions_1 = {
+        "R1" : "[c]C00002 + C00001 = C00008 + C00009",
+        "R2" : "[c]C00092 = C00085",
+        "R3" : "[c]C00149 + C00003 = C00011 + C00004 + C00022",
+        "R4" : ""
+    }
+    reactions_2 = {
+        "A" : "[c]C00008 + C00009 = C00002 + C00001",
+        "B" : "[c]C00092 = C00085",
+        "C" : "[c]C00149 + C00003 = C00011 + C00004 + C00022 + C00080",
+        "D" : "[c]C00031 + C00002 = C00092 + C00008"
+    }
+    expected_matches = [
+        ("R1", "A", -1, 1.0),
+        ("R2", "B", 1, 1.0),
+        ("R3", "C", 1, 5/6)
+    ]
+    assert approximate_match(reactions_1, reactions_2, 0.7) == expected_matches
+
+
+def read_net_reactions(lines, single):
+    # Read reaction IDs and equations from NET model lines
+    reactions = {}
+    for line in lines:
         if line.startswith("reaction"):
             if single and ";[" not in line:
                 continue
             line = line.strip().split(";")
-            reactions_2[line[1]] = line[2]
+            reactions[line[1]] = line[2]
+    return reactions
+
+def write_matches(outfile, reactions_1, reactions_2, approximate, threshold, top):
+    # Find approximately matching reaction pairs through MinHash/LSH
+    if approximate:
+        for match_result in approximate_match(
+            reactions_1, reactions_2, threshold, top
+            ):
+            outfile.write("\t".join(
+                list(match_result[0:2]) + [str(match_result[2])] + \
+                [str(round(match_result[3], 3))]
+            ) + "\n")
+        return
 
     # Check all reaction combinations
-    outfile = open(outfile_name, 'w')
     for rxn_id_1 in reactions_1:
         for rxn_id_2 in reactions_2:
             match_result = match(reactions_1[rxn_id_1], reactions_2[rxn_id_2])
             if match_result[0]:
                 outfile.write("\t".join([rxn_id_1, rxn_id_2, str(match_result[1])]) + "\n")
-    outfile.close()
+
+# Main code block
+
+def main(infile1, infile2, single, approximate, threshold, top, outfile_name):
+    # Read reactions from infiles
+    reactions_1 = read_net_reactions(open_file(infile1, 'r').readlines(), single)
+    reactions_2 = read_net_reactions(open_file(infile2, 'r').readlines(), single)
+
+    # Write matching reaction pairs
+    with open_file(outfile_name, 'w') as outfile:
+        write_matches(
+            outfile, reactions_1, reactions_2, approximate, threshold, top
+        )
 
 if __name__ == "__main__":
 
@@ -178,6 +357,18 @@ if __name__ == "__main__":
         '-s', '--single', action='store_true',
         help='Single compartment reactions only.'
     )
+    parser.add_argument(
+        '-a', '--approximate', action='store_true',
+        help='Match on metabolite set similarity through MinHash/LSH.'
+    )
+    parser.add_argument(
+        '-j', '--jaccard', type=float, default=0.7,
+        help='Minimum Jaccard index for approximate matches [0.7].'
+    )
+    parser.add_argument(
+        '-k', '--top', type=int, default=1,
+        help='Number of approximate matches to report per reaction [1].'
+    )
 
     # Output: Tab-delimited file specifying matching reaction pairs
     parser.add_argument(
@@ -188,4 +379,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # Run main function
-    main(args.infile1, args.infile2, args.single, args.outfile)
+    main(
+        args.infile1, args.infile2, args.single, args.approximate,
+        args.jaccard, args.top, args.outfile
+    )
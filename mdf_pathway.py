@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import sys
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from match_reactions import read_net_reactions
+from netaid_io import open_file
+from reaction_energies import model_bounds, read_concentration_bounds, \
+    species_formation_energies, stoichiometric_matrix
+from sample_concentrations import read_flux_directions
+from transform_thermo import R, T, read_compartments
+
+# Define functions
+def max_min_driving_force(S, drG0, directions, ln_lo, ln_hi):
+    # Maximize B subject to d (drG0 + RT S^T x) + B <= 0 for every active
+    # reaction and the log-concentration (M) bounds; variables are x and B
+    n_species, n_reactions = S.shape
+    A_ub = sparse.hstack([
+        S.T.multiply((directions * R * T)[:, None]),
+        np.ones((n_reactions, 1))
+    ]).tocsr()
+    b_ub = -directions * drG0
+    result = linprog(
+        np.r_[np.zeros(n_species), -1.0], A_ub=A_ub, b_ub=b_ub,
+        bounds=list(zip(ln_lo, ln_hi)) + [(None, None)], method="highs"
+    )
+    if result.status != 0:
+        sys.exit("Error: MDF problem could not be solved: " + result.message)
+    x = result.x[:n_species]
+    driving_forces = -directions * (drG0 + R * T * (S.T @ x))
+
+    # Shadow prices as change in MDF per unit relaxation of each constraint
+    return (
+        result.x[-1], x, driving_forces, 0.0 - result.ineqlin.marginals,
+        0.0 - result.lower.marginals[:n_species],
+        0.0 - result.upper.marginals[:n_species]
+    )
+
+def test_max_min_driving_force():
+    # A -> B -> C with A at 10 mM, C at 0.1 mM and B between 0.001 and 100 mM
+    S = sparse.csr_matrix(np.array([[-1.0, 0.0], [1.0, -1.0], [0.0, 1.0]]))
+    drG0 = np.array([5.0, -3.0])
+    ln_lo = np.log(np.array([10.0, 0.001, 0.1]) / 1000)
+    ln_hi = np.log(np.array([10.0, 100.0, 0.1]) / 1000)
+    mdf, x, driving_forces, reaction_prices, low_prices, high_prices = \
+        max_min_driving_force(S, drG0, np.array([1, 1]), ln_lo, ln_hi)
+
+    # Both steps share the overall driving force
+    overall = -(2.0 + R * T * np.log(0.1 / 10))
+    assert np.isclose(mdf, overall / 2)
+    assert np.allclose(driving_forces, [overall / 2, overall / 2])
+    assert np.isclose(reaction_prices.sum(), 1)
+
+    # Raising the substrate or lowering the product would help; the price
+    # of a fixed concentration is split between its two bounds
+    assert low_prices[0] + high_prices[0] > 0
+    assert low_prices[2] + high_prices[2] < 0
+    assert np.isclose(low_prices[1], 0) and np.isclose(high_prices[1], 0)
+
+
+# Main code block
+
+def main(model, thermo, experimental, fluxes, default_bounds, outfile_name):
+
+    # Read model, thermodynamics, concentration bounds and active reactions
+    net_model_text = open_file(model).read()
+    experimental_text = open_file(experimental).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    if fluxes:
+        active = dict([
+            (x.split("\t")[0], int(float(x.split("\t")[1])))
+            for x in open_file(fluxes).read().split("\n") if x.strip()
+        ])
+    else:
+        active = read_flux_directions(experimental_text)
+    active = dict([(k, v) for k, v in active.items() if v])
+    missing = sorted(set(active) - set(reactions))
+    if missing:
+        sys.exit("Error: Reactions not in model: " + ", ".join(missing))
+
+    # Energies of multi-compartment reactions lack the transported protons
+    for rxn_id in sorted(active):
+        if not reactions[rxn_id].startswith("["):
+            print(
+                "Skipping multi-compartment reaction " + rxn_id, file=sys.stderr
+            )
+            del active[rxn_id]
+    species, reaction_ids, S = stoichiometric_matrix(
+        dict([(k, reactions[k]) for k in sorted(active)])
+    )
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+    drG0 = S.T @ dfG_prime
+    if np.isnan(drG0).any():
+        sys.exit("Error: No standard reaction energy for " + ", ".join(
+            [reaction_ids[i] for i in np.flatnonzero(np.isnan(drG0))]
+        ))
+    lo, hi = model_bounds(
+        species, read_concentration_bounds(experimental_text), default_bounds
+    )
+    directions = np.array([active[rxn_id] for rxn_id in reaction_ids])
+
+    mdf, x, driving_forces, reaction_prices, low_prices, high_prices = \
+        max_min_driving_force(
+            S, drG0, directions, np.log(lo / 1000), np.log(hi / 1000)
+        )
+
+    # Write MDF, reaction driving forces and optimal concentrations (mM)
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("MDF\t" + str(round(mdf, 4)) + "\n")
+        outfile.write("\n")
+        outfile.write("\t".join([
+            "ID", "Direction", "drG0_prime", "DrivingForce", "ShadowPrice"
+        ]) + "\n")
+        for i, rxn_id in enumerate(reaction_ids):
+            outfile.write("\t".join([rxn_id, str(directions[i])] + [
+                str(round(v, 4)) for v in
+                (drG0[i], driving_forces[i], reaction_prices[i])
+            ]) + "\n")
+        outfile.write("\n")
+        outfile.write("\t".join([
+            "KEGGID", "Compartment", "Low", "High", "Optimal",
+            "ShadowPriceLow", "ShadowPriceHigh"
+        ]) + "\n")
+        for i, metabolite in enumerate(species):
+            kegg_id, compartment = metabolite.rstrip("]").split("[")
+            outfile.write("\t".join([kegg_id, compartment] + [
+                str(round(v, 6)) for v in
+                (lo[i], hi[i], np.exp(x[i]) * 1000, low_prices[i],
+                 high_prices[i])
+            ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data, experimental data, pathway
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+    parser.add_argument(
+        '-x', '--experimental', required=True,
+        help='Read experimental data file.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with active reactions ' + \
+        '[flux lines of the experimental file].'
+    )
+
+    # Options
+    parser.add_argument(
+        '-d', '--default_bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Concentration bounds (mM) of unmeasured metabolites [0.0001 10].'
+    )
+
+    # Output: MDF, driving forces, concentrations and shadow prices
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write MDF analysis to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.experimental, args.fluxes,
+        args.default_bounds, args.outfile
+    )
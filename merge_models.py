@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import os
+import re
+import sys
+from string import ascii_lowercase
+
+from cluster_reactions import canonical_reaction
+from netaid_io import open_file
+
+# Define functions
+def read_net_model(lines):
+    # Compartment rows, reactions in file order, biomass equation and thermo
+    # names from one pass over the NET model lines
+    compartments = []
+    reactions = []
+    biomass = None
+    names = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("compartment;"):
+            compartments.append(line.split(";")[1:])
+        elif line.startswith("reaction;"):
+            line = line.split(";")
+            if line[1] == "Biomass":
+                biomass = line[2]
+            else:
+                reactions.append((line[1], line[2]))
+        elif line.startswith("metabolite;"):
+            line = line.split(";")
+            names[line[1]] = line[2]
+    return (compartments, reactions, biomass, names)
+
+def retag(equation, tag_map):
+    # Replace compartment tags according to the merged compartment table
+    return re.sub(
+        "\[(.+?)\]", lambda x: "[" + tag_map[x.group(1)] + "]", equation
+    )
+
+def merge_models(models):
+    # Union of models, given as (label, read_net_model result) pairs
+    compartments = {}
+    description_tags = {}
+    reactions = {}
+    key_ids = {}
+    biomass = None
+    names = {}
+    conflicts = []
+    for label, (model_compartments, model_reactions, model_biomass,
+                model_names) in models:
+
+        # Map compartments by description, or by tag and pH, ionic strength
+        # and potential when the incoming compartment has no description,
+        # giving new tags where needed
+        tag_map = {}
+        for row in model_compartments:
+            row = row + [""] * (6 - len(row))
+            tag, values, description = row[0], row[1:5], row[5].strip()
+            new_tag = None
+            if description and description in description_tags:
+                new_tag = description_tags[description]
+            elif not description and tag in compartments and \
+                compartments[tag][1:4] == values[0:3]:
+                new_tag = tag
+            if new_tag is not None:
+                if compartments[new_tag][1:5] != values:
+                    conflicts.append([
+                        "compartment", label, tag,
+                        "Kept properties of " + new_tag + " (" + \
+                        ";".join(compartments[new_tag][1:5]) + ")"
+                    ])
+            else:
+                new_tag = tag
+                if new_tag in compartments:
+                    try:
+                        new_tag = [
+                            x for x in ascii_lowercase if x not in compartments
+                        ][0]
+                    except IndexError:
+                        sys.exit("Error: No free compartment tags left.")
+                    conflicts.append([
+                        "compartment", label, tag, "Renamed to " + new_tag
+                    ])
+                compartments[new_tag] = [new_tag] + values + [description]
+                if description:
+                    description_tags[description] = new_tag
+            tag_map[tag] = new_tag
+
+        # Collapse reactions equivalent to those of earlier models, and
+        # rename colliding IDs
+        model_keys = {}
+        for rxn_id, equation in model_reactions:
+            try:
+                equation = retag(equation, tag_map)
+            except KeyError as tag:
+                sys.exit(
+                    "Error: Reaction " + rxn_id + " in " + label + \
+                    " uses compartment " + tag.args[0] + \
+                    " that is not in the compartment block."
+                )
+            key = canonical_reaction(equation)[0]
+            if key is None:
+                # Reactions without stoichiometry are only equal by ID
+                key = ("reaction", rxn_id)
+            if key in key_ids and key not in model_keys:
+                if key_ids[key] != rxn_id:
+                    conflicts.append([
+                        "equivalent", label, rxn_id, "Merged into " + key_ids[key]
+                    ])
+                continue
+            new_id = rxn_id
+            if new_id in reactions:
+                new_id = rxn_id + "_" + label
+                i = 2
+                while new_id in reactions:
+                    new_id = rxn_id + "_" + label + "_" + str(i)
+                    i += 1
+                conflicts.append([
+                    "renamed", label, rxn_id, "Renamed to " + new_id
+                ])
+            reactions[new_id] = equation
+            key_ids.setdefault(key, new_id)
+            model_keys[key] = new_id
+
+        # Keep the first biomass reaction
+        if model_biomass:
+            if biomass is None:
+                biomass = model_biomass
+            elif model_biomass != biomass:
+                conflicts.append([
+                    "biomass", label, "Biomass", "Kept first biomass reaction"
+                ])
+
+        # Keep the first name of each metabolite
+        for kegg_id in model_names:
+            if kegg_id not in names:
+                names[kegg_id] = model_names[kegg_id]
+            elif names[kegg_id] != model_names[kegg_id]:
+                conflicts.append([
+                    "metabolite", label, kegg_id,
+                    "Kept name " + names[kegg_id]
+                ])
+
+    return (compartments, reactions, biomass, names, conflicts)
+
+def test_merge_models():
+    model_1 = read_net_model([
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "compartment;e;7.0;0.1;0;0;extracellular",
+        "reaction;ATPM;[c]C00002 + C00001 = C00008 + C00009;;;;",
+        "reaction;GLCt;C00031[e] = C00031[c];;;;",
+        "reaction;Biomass;C00002 = C00008",
+        "metabolite;C00001;C00001",
+        "metabolite;C00002;C00002"
+    ])
+    model_2 = read_net_model([
+        "compartment;c;7.2;0.1;0;0.7;cytosol",
+        "compartment;e;5.0;0.1;0;0.1;thylakoid lumen",
+        "reaction;ATPase;[c]C00008 + C00009 = C00002 + C00001;;;;",
+        "reaction;GLCt;[e]C00031 = C00092;;;;",
+        "metabolite;C00001;h2o"
+    ])
+    compartments, reactions, biomass, names, conflicts = merge_models(
+        [("m1", model_1), ("m2", model_2)]
+    )
+    assert sorted(compartments) == ["a", "c", "e"]
+    assert compartments["a"] == ["a", "5.0", "0.1", "0", "0.1", "thylakoid lumen"]
+    assert reactions == {
+        "ATPM" : "[c]C00002 + C00001 = C00008 + C00009",
+        "GLCt" : "C00031[e] = C00031[c]",
+        "GLCt_m2" : "[a]C00031 = C00092"
+    }
+    assert biomass == "C00002 = C00008"
+    assert names == {"C00001" : "C00001", "C00002" : "C00002"}
+    assert conflicts == [
+        ["compartment", "m2", "c", "Kept properties of c (7.4;0.1;0;0.7)"],
+        ["compartment", "m2", "e", "Renamed to a"],
+        ["equivalent", "m2", "ATPase", "Merged into ATPM"],
+        ["renamed", "m2", "GLCt", "Renamed to GLCt_m2"],
+        ["metabolite", "m2", "C00001", "Kept name C00001"]
+    ]
+
+
+def test_merge_models_blank_descriptions():
+    model_1 = read_net_model([
+        "compartment;c;7.4;0.1;0;0.7;",
+        "compartment;e;7.0;0.1;0;0",
+        "reaction;GLCt;C00031[e] = C00031[c];;;;",
+        "reaction;EMPTY1;;;;;"
+    ])
+    model_2 = read_net_model([
+        "compartment;c;7.4;0.1;0;0.7;",
+        "compartment;e;5.0;0.1;0;0.1;",
+        "reaction;PGI;[c]C00092 = C00085;;;;",
+        "reaction;EX;[e]C00031 = ;;;;",
+        "reaction;EMPTY2;;;;;"
+    ])
+    compartments, reactions, biomass, names, conflicts = merge_models(
+        [("m1", model_1), ("m2", model_2)]
+    )
+
+    # Blank descriptions do not join compartments; tag and properties do
+    assert compartments == {
+        "c" : ["c", "7.4", "0.1", "0", "0.7", ""],
+        "e" : ["e", "7.0", "0.1", "0", "0", ""],
+        "a" : ["a", "5.0", "0.1", "0", "0.1", ""]
+    }
+    # Reactions without stoichiometry are not merged with each other
+    assert reactions == {
+        "GLCt" : "C00031[e] = C00031[c]", "EMPTY1" : "",
+        "PGI" : "[c]C00092 = C00085", "EX" : "[a]C00031 = ", "EMPTY2" : ""
+    }
+    assert conflicts == [["compartment", "m2", "e", "Renamed to a"]]
+
+
+def test_merge_models_different_descriptions():
+    model_1 = read_net_model([
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "compartment;p;7.4;0.1;0;0.1;periplasm",
+        "reaction;GLCt;C00031[c] = C00031[p];;;;"
+    ])
+    model_2 = read_net_model([
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "compartment;p;7.4;0.1;0;0.2;peroxisome",
+        "reaction;GLCtx;C00031[c] = C00031[p];;;;",
+        "reaction;PGIx;[p]C00092 = C00085;;;;"
+    ])
+    compartments, reactions, biomass, names, conflicts = merge_models(
+        [("m1", model_1), ("m2", model_2)]
+    )
+
+    # Equal tags and properties do not join described compartments
+    assert compartments["a"] == ["a", "7.4", "0.1", "0", "0.2", "peroxisome"]
+    assert reactions == {
+        "GLCt" : "C00031[c] = C00031[p]",
+        "GLCtx" : "C00031[c] = C00031[a]",
+        "PGIx" : "[a]C00092 = C00085"
+    }
+    assert conflicts == [["compartment", "m2", "p", "Renamed to a"]]
+
+
+def write_net_model(f, compartments, reactions, biomass, names):
+    # Write the merged model in the layout of model_format.py
+    f.write(";ID;pH;IS;Potential mV;Volume;\n")
+    for tag in compartments:
+        f.write(";".join(["compartment"] + compartments[tag]) + "\n")
+    f.write("\n")
+    f.write(";Model;;;;;\n")
+    f.write("\n")
+    f.write(";Abbreviation;reactions;;;;\n")
+    for rxn_id in sorted(reactions):
+        f.write("reaction;" + rxn_id + ";" + reactions[rxn_id] + ";;;;\n")
+    if biomass:
+        f.write("\n")
+        f.write(";Biomass Reaction;\n")
+        f.write("reaction;Biomass;" + biomass + "\n")
+    f.write("\n")
+    f.write("\n")
+    f.write("Thermo names;;\n")
+    f.write("\n")
+
+    # Metabolites present in at least one reaction
+    used = set(re.findall(
+        "C[0-9]{5}", " ".join(list(reactions.values()) + [biomass or ""])
+    ))
+    f.write(";Metabolite (don't change);Name in model\n")
+    for kegg_id in sorted(used):
+        f.write(
+            "metabolite;" + kegg_id + ";" + names.get(kegg_id, kegg_id) + "\n"
+        )
+    f.write("\n")
+
+
+# Main code block
+
+def main(infiles, labels, report, outfile_name):
+    labels = labels or [os.path.basename(x).split(".")[0] for x in infiles]
+    if len(labels) != len(infiles):
+        sys.exit("Error: Number of labels does not match number of files.")
+
+    # Read models one at a time
+    models = []
+    for infile, label in zip(infiles, labels):
+        with open_file(infile) as f:
+            models.append((label, read_net_model(f)))
+
+    compartments, reactions, biomass, names, conflicts = merge_models(models)
+
+    with open_file(outfile_name, 'w') as outfile:
+        write_net_model(outfile, compartments, reactions, biomass, names)
+
+    # Write conflicts
+    if report:
+        with open_file(report, 'w') as outfile:
+            outfile.write("\t".join(["Type", "Model", "ID", "Resolution"]) + "\n")
+            outfile.write("".join(["\t".join(x) + "\n" for x in conflicts]))
+    else:
+        print(str(len(conflicts)) + " conflicts resolved.", file=sys.stderr)
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET models
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read NET model files, in order of priority.'
+    )
+    parser.add_argument(
+        '-l', '--labels', nargs='+',
+        help='Labels for the models, used in renamed IDs [file names].'
+    )
+
+    # Output: Merged model, conflict report
+    parser.add_argument(
+        '-r', '--report',
+        help='Write tab-delimited conflict report.'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write merged NET model file.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.infiles, args.labels, args.report, args.outfile)
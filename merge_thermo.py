@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import heapq
+import io
+import itertools
+import os
+import sys
+import tempfile
+
+from netaid_io import open_file
+from thermo_format import cc_columns
+from transform_thermo import model_species
+
+# Define functions
+def cc_header(f, name):
+    # Column positions from the header line of a component-contribution file
+    header_line = f.readline().strip()
+    if not header_line.startswith("Compound ID"):
+        sys.exit("Error: " + name + " lacks a Compound ID header line.")
+    return cc_columns(header_line)
+
+def sorted_lines(f, key_column, chunk_size):
+    # Lines of a file in stable key order by an external merge sort; sorted
+    # runs of chunk_size lines go to temporary files unless the whole file
+    # fits in one run
+    key = lambda x: x.split(",")[key_column]
+    runs = []
+    while True:
+        chunk = list(itertools.islice(f, chunk_size))
+        lines = sorted([x.strip() for x in chunk if x.strip()], key=key)
+        if not runs and len(chunk) < chunk_size:
+            return iter(lines)
+        run = tempfile.TemporaryFile('w+')
+        run.write("".join([x + "\n" for x in lines]))
+        run.seek(0)
+        runs.append(run)
+        if len(chunk) < chunk_size:
+            break
+    return heapq.merge(
+        *[(x.rstrip("\n") for x in run) for run in runs], key=key
+    )
+
+def compound_blocks(lines, columns, with_std):
+    # Pseudoisomer rows of each compound from lines sorted by Compound ID, in
+    # the merged column layout; rows without a formation energy are left out
+    compound_id = None
+    rows = []
+    for line in lines:
+        fields = line.split(",")
+        if fields[columns["Compound ID"]] != compound_id:
+            if compound_id is not None:
+                yield (compound_id, rows)
+            compound_id = fields[columns["Compound ID"]]
+            rows = []
+        if fields[columns["dG0_f"]] == "nan":
+            continue
+        row = [
+            fields[columns[x]] for x in ("Compound ID", "nH", "charge", "dG0_f")
+        ]
+        if with_std:
+            if columns["dG0_f_std"] is None:
+                row.append("")
+            else:
+                row.append(fields[columns["dG0_f_std"]])
+        rows.append(",".join(row))
+    if compound_id is not None:
+        yield (compound_id, rows)
+
+def prioritized_blocks(blocks, priority):
+    for compound_id, rows in blocks:
+        yield (compound_id, priority, rows)
+
+def merge_blocks(sources):
+    # k-way merge of block streams given in priority order; each compound
+    # gets the rows of the first source that has any
+    merged = heapq.merge(*[
+        prioritized_blocks(source, priority)
+        for priority, source in enumerate(sources)
+    ], key = lambda x: x[0:2])
+    current = None
+    for compound_id, priority, rows in merged:
+        if compound_id == current or not rows:
+            continue
+        current = compound_id
+        yield (compound_id, priority, rows)
+
+def test_merge_blocks():
+    source_1 = "\n".join([
+        "Compound ID,nH,charge,dG0_f",
+        "C00008,12,-3,-1906.13",
+        "C00001,2,0,-237.19",
+        "C00002,12,-4,nan",
+        "C00008,13,-2,-1947.1"
+    ])
+    source_2 = "\n".join([
+        "Compound ID,dG0_f,uncertainty,nH,charge",
+        "C00001,-200,1.5,2,0",
+        "C00002,-2768.1,2.1,12,-4",
+        "C00002,-2811.48,2.1,13,-3",
+        "C00009,-1096.1,0.9,1,-2"
+    ])
+    sources = []
+    for text in (source_1, source_2):
+        f = io.StringIO(text + "\n")
+        columns = cc_header(f, "source")
+
+        # Runs of two lines exercise the merge of temporary files
+        sources.append(compound_blocks(
+            sorted_lines(f, columns["Compound ID"], 2), columns, True
+        ))
+
+    # Pseudoisomers keep their order; C00002 has no energies in the first
+    # source, so the second one is used
+    assert list(merge_blocks(sources)) == [
+        ("C00001", 0, ["C00001,2,0,-237.19,"]),
+        ("C00002", 1, [
+            "C00002,12,-4,-2768.1,2.1", "C00002,13,-3,-2811.48,2.1"
+        ]),
+        ("C00008", 0, [
+            "C00008,12,-3,-1906.13,", "C00008,13,-2,-1947.1,"
+        ]),
+        ("C00009", 1, ["C00009,1,-2,-1096.1,0.9"])
+    ]
+
+
+# Main code block
+
+def main(infiles, models, chunk_size, report, outfile_name):
+
+    # Metabolites of each model, to check coverage while merging
+    model_ids = {}
+    for model in models or []:
+        model_ids[model] = set([
+            kegg_id for kegg_id, compartment in
+            model_species(open_file(model).read())
+        ])
+    wanted = set().union(*model_ids.values())
+    covered = set()
+
+    # Merge sources one compound at a time; the merged file has a standard
+    # error column when any source has one
+    files = [open_file(infile) for infile in infiles]
+    columns = [cc_header(f, infile) for f, infile in zip(files, infiles)]
+    with_std = any([x["dG0_f_std"] is not None for x in columns])
+    sources = [
+        compound_blocks(
+            sorted_lines(f, c["Compound ID"], chunk_size), c, with_std
+        )
+        for f, c in zip(files, columns)
+    ]
+    counts = [0] * len(infiles)
+    with open_file(outfile_name, 'w') as outfile:
+        header = ["Compound ID", "nH", "charge", "dG0_f"]
+        if with_std:
+            header.append("dG0_f_std")
+        outfile.write(",".join(header) + "\n")
+        for compound_id, priority, rows in merge_blocks(sources):
+            outfile.write("".join([x + "\n" for x in rows]))
+            counts[priority] += 1
+            if compound_id in wanted:
+                covered.add(compound_id)
+    for f in files:
+        f.close()
+
+    # Write compounds taken from each source and metabolites still missing
+    report_text = "\t".join(["Source", "Compounds"]) + "\n"
+    for infile, count in zip(infiles, counts):
+        report_text += "\t".join([os.path.basename(infile), str(count)]) + "\n"
+    if model_ids:
+        report_text += "\n"
+        report_text += "\t".join(
+            ["Model", "Metabolites", "Covered", "Missing"]
+        ) + "\n"
+        for model in models:
+            missing = sorted(model_ids[model] - covered)
+            report_text += "\t".join([
+                os.path.basename(model), str(len(model_ids[model])),
+                str(len(model_ids[model]) - len(missing)),
+                ",".join(missing) or "NA"
+            ]) + "\n"
+    if report:
+        with open_file(report, 'w') as outfile:
+            outfile.write(report_text)
+    else:
+        sys.stderr.write(report_text)
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: CC thermo files, NET models
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read CC thermo files, in order of priority.'
+    )
+    parser.add_argument(
+        '-m', '--models', nargs='+',
+        help='Read NET model files to report missing metabolites for.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-n', '--chunk_size', type=int, default=100000,
+        help='Lines per sorted run held in memory [100000].'
+    )
+
+    # Output: Merged thermo file, coverage report
+    parser.add_argument(
+        '-r', '--report',
+        help='Write tab-delimited source and coverage report [stderr].'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write merged CC thermo file.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.infiles, args.models, args.chunk_size, args.report, args.outfile
+    )
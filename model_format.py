@@ -6,6 +6,8 @@ import sys
 import argparse
 from string import ascii_lowercase
 
+from netaid_io import open_file
+
 # Define functions
 def create_compartment_dict(equations):
     # Count compartment occurrences
@@ -51,9 +53,10 @@ def create_compartment_dict(equations):
             tags_changed = True
             break
     if tags_changed:
-        print("Compartment tags have been changed:")
+        # Informative output goes to stderr, as stdout may carry the model
+        print("Compartment tags have been changed:", file=sys.stderr)
         for tag_pair in new_tags.items():
-            print("%s --> %s" % tag_pair)
+            print("%s --> %s" % tag_pair, file=sys.stderr)
 
     # Return translation dictionary
     return new_tags
@@ -357,12 +360,10 @@ def test_add_metabolites_from_reaction():
     assert metabolites == exp_metabolites
 
 
-# Main code block
-def main(metabolites, reactions, compartments, biomass, fluxes, outfile_name):
-
+def read_name_kegg_dict(metabolites):
     # Read metabolite table into dictionary
     name_kegg_dict = dict(
-        [L.strip().split("\t") for L in open(metabolites, 'r').readlines()]
+        [L.strip().split("\t") for L in open_file(metabolites, 'r').readlines()]
     )
 
     # Remove entries that do not have a valid KEGG ID
@@ -373,15 +374,18 @@ def main(metabolites, reactions, compartments, biomass, fluxes, outfile_name):
     for n in no_kegg_id_names:
         del(name_kegg_dict[n])
 
+    return name_kegg_dict
+
+def read_reaction_dict(reactions, fluxes):
     # Read reactions
     reaction_dict = dict(
-        [L.split("\t") for L in open(reactions, 'r').readlines()]
+        [L.split("\t") for L in open_file(reactions, 'r').readlines()]
     )
 
     # Reduce reactions to those in separate file (fluxes)
     if fluxes:
         accepted_reactions = set(filter(
-            None, [x.split("\t")[0] for x in open(fluxes).readlines()]
+            None, [x.split("\t")[0] for x in open_file(fluxes).readlines()]
         ))
         for rejected_reaction in set(reaction_dict) - accepted_reactions:
             try:
@@ -389,70 +393,143 @@ def main(metabolites, reactions, compartments, biomass, fluxes, outfile_name):
             except KeyError:
                 continue
 
+    return reaction_dict
+
+def write_model(f, name_kegg_dict, reaction_dict, compartment_description,
+                biomass_equation, reformat=reformat_reaction):
+
     # Construct compartment dictionary
     cm_dict = create_compartment_dict(reaction_dict.values())
 
-    # Read compartment description file
-    compartment_description = [
-        L.split("\t") for L in open(compartments, 'r').readlines()
-    ]
-
-    # Construct and write output to outfile
-    with open(outfile_name, 'w') as f:
+    # Write compartment description to outfile
+    f.write(";ID;pH;IS;Potential mV;Volume;\n")
+    for line in compartment_description:
+        try:
+            line = "compartment;" + cm_dict[line[0]] + ";" + ";".join(line[1:])
+        except KeyError:
+            continue
+        f.write(line)
+
+    # Write "Model" header to outfile
+    f.write("\n")
+    f.write(";Model;;;;;\n")
+    f.write("\n")
+
+    # Write reactions to outfile
+    written_reactions = set()
+
+    rxn_cpds = set() # Collect metabolites
+
+    f.write(";Abbreviation;reactions;;;;\n")
+    for reaction_id in sorted(reaction_dict):
+        reaction = reformat(
+            reaction_dict[reaction_id], name_kegg_dict, cm_dict
+        )
+        if reaction in written_reactions:
+            # Do not write more than the first of one specific reaction
+            continue
+        if reaction:
+            f.write("reaction;" + reaction_id + ";" + reaction + ";;;;\n")
+            rxn_cpds = add_metabolites_from_reaction(rxn_cpds, reaction)
+            written_reactions.add(reaction)
+
+    # Write biomass reaction to outfile (if applicable)
+    if biomass_equation:
+        biomass_reaction = re.sub("\[.+?\]", "", reformat(
+            biomass_equation, name_kegg_dict, cm_dict
+        ))
+        f.write("\n")
+        f.write(";Biomass Reaction;\n")
+        f.write("reaction;Biomass;" + biomass_reaction + "\n")
+
+    # Write "Thermo names header to outfile"
+    f.write("\n")
+    f.write("\n")
+    f.write("Thermo names;;\n")
+    f.write("\n")
+
+    # Write metabolite names to outfile, if present in at least one reaction
+    f.write(";Metabolite (don't change);Name in model\n")
+    for kegg_id in sorted(set(name_kegg_dict.values())):
+        if kegg_id in rxn_cpds:
+            f.write("metabolite;" + kegg_id + ";" + kegg_id + "\n")
+    f.write("\n")
+
+
+def memoize_reformat(reformat=reformat_reaction):
+    # Cache reformatted reactions by equation and compartment mapping, for
+    # models that share one metabolite name table
+    cache = {}
+    def memoized_reformat(equation, name_kegg_dict, compartment_dict):
+        key = (equation, tuple(sorted(compartment_dict.items())))
+        try:
+            return cache[key]
+        except KeyError:
+            cache[key] = reformat(equation, name_kegg_dict, compartment_dict)
+            return cache[key]
+    return memoized_reformat
+
+def test_memoize_reformat():
+    calls = []
+    def reformat(equation, name_kegg_dict, compartment_dict):
+        calls.append(equation)
+        return reformat_reaction(equation, name_kegg_dict, compartment_dict)
+    name_kegg_dict = {"atp" : "C00002", "adp" : "C00008"}
+    memoized_reformat = memoize_reformat(reformat)
+    for cm_dict in ({"c" : "c"}, {"c" : "c"}, {"c" : "m"}):
+        reaction = memoized_reformat("atp[c] <=> adp[c]", name_kegg_dict, cm_dict)
+    assert reaction == "[m]C00002 = C00008"
+    assert len(calls) == 2
+
+
+def read_batch_table(batch):
+    # One model per line: reactions, compartments, outfile, biomass, fluxes
+    jobs = []
+    for line in open_file(batch, 'r').readlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip("\n").split("\t")
+        if len(line) < 3:
+            sys.exit("Error: Batch table needs reactions, compartments and outfile.")
+        line = line + [""] * (5 - len(line))
+        jobs.append(tuple(
+            [line[0], line[1], line[3] or None, line[4] or None, line[2]]
+        ))
+    return jobs
 
-        # Write compartment description to outfile
-        f.write(";ID;pH;IS;Potential mV;Volume;\n")
-        for line in compartment_description:
-            try:
-                line = "compartment;" + cm_dict[line[0]] + ";" + ";".join(line[1:])
-            except KeyError:
-                continue
-            f.write(line)
 
-        # Write "Model" header to outfile
-        f.write("\n")
-        f.write(";Model;;;;;\n")
-        f.write("\n")
+# Main code block
+def main(metabolites, reactions, compartments, biomass, fluxes, outfile_name,
+         batch=None):
 
-        # Write reactions to outfile
-        written_reactions = set()
+    # Read the metabolite table once for all models
+    name_kegg_dict = read_name_kegg_dict(metabolites)
+    if batch:
+        jobs = read_batch_table(batch)
+    else:
+        jobs = [(reactions, compartments, biomass, fluxes, outfile_name)]
+    reformat = memoize_reformat()
 
-        rxn_cpds = set() # Collect metabolites
+    for reactions, compartments, biomass, fluxes, outfile_name in jobs:
+        reaction_dict = read_reaction_dict(reactions, fluxes)
 
-        f.write(";Abbreviation;reactions;;;;\n")
-        for reaction_id in sorted(reaction_dict):
-            reaction = reformat_reaction(
-                reaction_dict[reaction_id], name_kegg_dict, cm_dict
-            )
-            if reaction in written_reactions:
-                # Do not write more than the first of one specific reaction
-                continue
-            if reaction:
-                f.write("reaction;" + reaction_id + ";" + reaction + ";;;;\n")
-                rxn_cpds = add_metabolites_from_reaction(rxn_cpds, reaction)
-                written_reactions.add(reaction)
+        # Read compartment description file
+        compartment_description = [
+            L.split("\t") for L in open_file(compartments, 'r').readlines()
+        ]
 
-        # Write biomass reaction to outfile (if applicable)
+        # Read biomass reaction (if applicable)
         if biomass:
-            biomass_reaction = re.sub("\[.+?\]", "", reformat_reaction(
-                open(biomass, 'r').read().strip(), name_kegg_dict, cm_dict
-            ))
-            f.write("\n")
-            f.write(";Biomass Reaction;\n")
-            f.write("reaction;Biomass;" + biomass_reaction + "\n")
-
-        # Write "Thermo names header to outfile"
-        f.write("\n")
-        f.write("\n")
-        f.write("Thermo names;;\n")
-        f.write("\n")
+            biomass_equation = open_file(biomass, 'r').read().strip()
+        else:
+            biomass_equation = None
 
-        # Write metabolite names to outfile, if present in at least one reaction
-        f.write(";Metabolite (don't change);Name in model\n")
-        for kegg_id in sorted(set(name_kegg_dict.values())):
-            if kegg_id in rxn_cpds:
-                f.write("metabolite;" + kegg_id + ";" + kegg_id + "\n")
-        f.write("\n")
+        # Construct and write output to outfile
+        with open_file(outfile_name, 'w') as f:
+            write_model(
+                f, name_kegg_dict, reaction_dict, compartment_description,
+                biomass_equation, reformat
+            )
 
 if __name__ == "__main__":
 
@@ -465,11 +542,11 @@ if __name__ == "__main__":
         help='Read tab-delimited file with metabolite names and IDs.'
     )
     parser.add_argument(
-        '-r', '--reactions', required=True,
+        '-r', '--reactions',
         help='Read tab-delimited file with reaction IDs and equations.'
     )
     parser.add_argument(
-        '-c', '--compartments', required=True,
+        '-c', '--compartments',
         help='Read tab-delimited file with compartment properties.'
     )
 
@@ -485,14 +562,26 @@ if __name__ == "__main__":
 
     # Output: NET-compatible model text file
     parser.add_argument(
-        '-o', '--outfile', type=str, required=True,
+        '-o', '--outfile', type=str,
         help='NET-formatted model text file.'
     )
 
+    # Batch: Several models sharing the metabolite table
+    parser.add_argument(
+        '-B', '--batch',
+        help='Tab-delimited table with reactions, compartments, outfile, ' + \
+        'biomass and flux file per model.'
+    )
+
     args = parser.parse_args()
 
+    if not args.batch and not (
+        args.reactions and args.compartments and args.outfile
+        ):
+        parser.error("-r, -c and -o are required without --batch")
+
     # Run main function
     main(
         args.metabolites, args.reactions, args.compartments,
-        args.biomass, args.minimize, args.outfile
+        args.biomass, args.minimize, args.outfile, args.batch
     )
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import file_signature, open_file
+
+# Version of the index layout; older sidecar files are rebuilt
+global index_version
+index_version = 2
+
+# Define functions
+def build_index(net_model_text):
+    # Parse a NET model once into lookup tables
+    equations = read_net_reactions(net_model_text.split("\n"), False)
+    stoichiometry = {}
+    metabolites = {}
+    for rxn_id in equations:
+        if rxn_id == "Biomass" or not equations[rxn_id]:
+            continue
+        stoichiometry[rxn_id] = reaction_stoichiometry(equations[rxn_id])
+        for species in stoichiometry[rxn_id]:
+            kegg_id, compartment = species.rstrip("]").split("[")
+            metabolites.setdefault(kegg_id, {}).setdefault(
+                compartment, set()
+            ).add(rxn_id)
+    compartments = {}
+    for line in net_model_text.split("\n"):
+        if line.startswith("compartment;"):
+            # Potential, volume and description may be left out
+            line = line.strip().split(";")
+            line = line + [""] * (7 - len(line))
+            compartments[line[1]] = {
+                "pH" : float(line[2]), "IS" : float(line[3]),
+                "potential" : float(line[4] or 0),
+                "volume" : float(line[5] or 0), "description" : line[6]
+            }
+    return {
+        "version" : index_version, "equations" : equations,
+        "stoichiometry" : stoichiometry, "metabolites" : metabolites,
+        "compartments" : compartments
+    }
+
+def sidecar_path(model):
+    return model + ".idx"
+
+def index_to_json(index):
+    # Reaction sets as sorted lists
+    data = dict(index)
+    data["metabolites"] = dict([
+        (kegg_id, dict([
+            (compartment, sorted(rxn_ids))
+            for compartment, rxn_ids in by_compartment.items()
+        ]))
+        for kegg_id, by_compartment in index["metabolites"].items()
+    ])
+    return data
+
+def index_from_json(data):
+    index = dict(data)
+    index["metabolites"] = dict([
+        (kegg_id, dict([
+            (compartment, set(rxn_ids))
+            for compartment, rxn_ids in by_compartment.items()
+        ]))
+        for kegg_id, by_compartment in data["metabolites"].items()
+    ])
+    return index
+
+def load_index(model, sidecar=True):
+    # Reuse the JSON index next to the model while the model is unchanged;
+    # the sidecar is plain data, so reading it never runs code
+    if model == "-" or not sidecar:
+        return build_index(open_file(model).read())
+    signature = list(file_signature(model))
+    try:
+        with open(sidecar_path(model)) as f:
+            stored = json.load(f)
+        if stored["signature"] == signature and \
+            stored["index"]["version"] == index_version:
+            return index_from_json(stored["index"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    index = build_index(open_file(model).read())
+    try:
+        temporary = sidecar_path(model) + "." + str(os.getpid())
+        with open(temporary, 'w') as f:
+            json.dump(
+                {"signature" : signature, "index" : index_to_json(index)}, f
+            )
+        os.replace(temporary, sidecar_path(model))
+    except OSError:
+        # Read-only location; work without sidecar
+        pass
+    return index
+
+def metabolite_reactions(index, kegg_id, compartment=None):
+    # Reactions with the metabolite, in one or in any compartment
+    by_compartment = index["metabolites"].get(kegg_id, {})
+    if compartment:
+        return by_compartment.get(compartment, set())
+    return set().union(*by_compartment.values())
+
+def shared_metabolites(index):
+    # Metabolites that occur in more than one compartment
+    return dict([
+        (kegg_id, sorted(index["metabolites"][kegg_id]))
+        for kegg_id in index["metabolites"]
+        if len(index["metabolites"][kegg_id]) > 1
+    ])
+
+def reaction_neighbours(index, rxn_id):
+    # Reactions sharing at least one metabolite (in its compartment)
+    neighbours = set()
+    for species in index["stoichiometry"].get(rxn_id, {}):
+        kegg_id, compartment = species.rstrip("]").split("[")
+        neighbours.update(metabolite_reactions(index, kegg_id, compartment))
+    neighbours.discard(rxn_id)
+    return neighbours
+
+def test_index_lookups():
+    net_model_text = "\n".join([
+        ";ID;pH;IS;Potential mV;Volume;",
+        "compartment;c;7.4;0.1;0;0.7;cytosol",
+        "compartment;e;7.0;0.1;0;0",
+        "",
+        ";Model;;;;;",
+        "",
+        ";Abbreviation;reactions;;;;",
+        "reaction;ATPM;[c]C00002 + C00001 = C00008 + C00009;;;;",
+        "reaction;HEX1;[c]C00002 + C00031 = C00008 + C00092;;;;",
+        "reaction;PGI;[c]C00092 = C00085;;;;",
+        "reaction;GLCt;C00031[e] = C00031[c];;;;",
+        "",
+        ";Biomass Reaction;",
+        "reaction;Biomass;C00002 = C00008",
+        ""
+    ])
+    index = build_index(net_model_text)
+    assert index["stoichiometry"]["PGI"] == {"C00092[c]" : -1, "C00085[c]" : 1}
+    assert "Biomass" not in index["stoichiometry"]
+    assert index["compartments"]["e"]["pH"] == 7.0
+    assert metabolite_reactions(index, "C00002", "c") == {"ATPM", "HEX1"}
+    assert metabolite_reactions(index, "C00031") == {"HEX1", "GLCt"}
+    assert metabolite_reactions(index, "C00031", "e") == {"GLCt"}
+    assert shared_metabolites(index) == {"C00031" : ["c", "e"]}
+    assert reaction_neighbours(index, "PGI") == {"HEX1"}
+    assert reaction_neighbours(index, "GLCt") == {"HEX1"}
+
+    # The sidecar holds the same index
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, "model.csv")
+        with open(model, 'w') as f:
+            f.write(net_model_text)
+        assert load_index(model) == index
+        assert os.path.exists(sidecar_path(model))
+        assert load_index(model) == index
+
+
+# Main code block
+
+def main(model, sidecar, query, arguments, outfile_name):
+    index = load_index(model, sidecar)
+
+    # Answer the query as tab-delimited lines
+    lines = []
+    if query == "reaction":
+        for rxn_id in arguments:
+            if rxn_id not in index["equations"]:
+                sys.exit("Error: Reaction " + rxn_id + " not in model.")
+            stoichiometry = index["stoichiometry"].get(rxn_id, {})
+            for species in sorted(stoichiometry):
+                lines.append([rxn_id, species, str(stoichiometry[species])])
+    elif query == "metabolite":
+        for species in arguments:
+            kegg_id = species.split("[")[0]
+            compartment = species.rstrip("]").split("[")[1] \
+                if "[" in species else None
+            for rxn_id in sorted(
+                metabolite_reactions(index, kegg_id, compartment)
+                ):
+                lines.append([species, rxn_id, index["equations"][rxn_id]])
+    elif query == "neighbours":
+        for rxn_id in arguments:
+            for neighbour in sorted(reaction_neighbours(index, rxn_id)):
+                lines.append([rxn_id, neighbour, index["equations"][neighbour]])
+    elif query == "shared":
+        shared = shared_metabolites(index)
+        for kegg_id in sorted(shared):
+            lines.append([kegg_id, ",".join(shared[kegg_id])])
+    elif query == "compartments":
+        for tag in sorted(index["compartments"]):
+            c = index["compartments"][tag]
+            lines.append([tag] + [
+                str(c[k]) for k in
+                ("pH", "IS", "potential", "volume", "description")
+            ])
+
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("".join(["\t".join(x) + "\n" for x in lines]))
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model
+    parser.add_argument(
+        'model',
+        help='Read NET model file (index is kept in <model>.idx).'
+    )
+
+    # Options
+    parser.add_argument(
+        '-n', '--no_sidecar', action='store_true',
+        help='Do not read or write the index sidecar file.'
+    )
+
+    # Output: Query results
+    parser.add_argument(
+        '-o', '--outfile', default='-',
+        help='Write tab-delimited query results to outfile [stdout].'
+    )
+
+    # Queries
+    subparsers = parser.add_subparsers(dest='query', required=True)
+    subparsers.add_parser(
+        'reaction', help='Stoichiometry of reactions.'
+    ).add_argument('ids', nargs='+')
+    subparsers.add_parser(
+        'metabolite', help='Reactions of metabolites, e.g. C00002 or C00002[c].'
+    ).add_argument('ids', nargs='+')
+    subparsers.add_parser(
+        'neighbours', help='Reactions sharing metabolites with reactions.'
+    ).add_argument('ids', nargs='+')
+    subparsers.add_parser(
+        'shared', help='Metabolites in more than one compartment.'
+    )
+    subparsers.add_parser(
+        'compartments', help='Compartment table.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, not args.no_sidecar, args.query,
+        getattr(args, 'ids', []), args.outfile
+    )
@@ -0,0 +1,119 @@
+# Import modules
+import bz2
+import gzip
+import io
+import lzma
+import os
+import sys
+import tempfile
+
+# Large buffers for network filesystems
+global buffer_size
+buffer_size = 1 << 20
+
+# Magic bytes and extensions of supported compression formats
+global magic_bytes, extensions
+magic_bytes = [
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd")
+]
+extensions = {
+    ".gz" : "gzip", ".bz2" : "bz2", ".xz" : "xz", ".zst" : "zstd"
+}
+
+# Define functions
+def detect_compression(path, head):
+    # Magic bytes decide for existing data, the extension for new files
+    for magic, compression in magic_bytes:
+        if head.startswith(magic):
+            return compression
+    if head:
+        return None
+    return extensions.get(os.path.splitext(path)[1])
+
+def test_detect_compression():
+    assert detect_compression("a.csv", gzip.compress(b"x")[:6]) == "gzip"
+    assert detect_compression("a.csv", bz2.compress(b"x")[:6]) == "bz2"
+    assert detect_compression("a.csv", lzma.compress(b"x")[:6]) == "xz"
+    assert detect_compression("a.csv.gz", b"Compou") == None
+    assert detect_compression("a.csv.zst", b"") == "zstd"
+    assert detect_compression("a.csv", b"") == None
+
+
+def open_zstd(fileobj, mode):
+    try:
+        import zstandard
+    except ImportError:
+        sys.exit("Error: Python module 'zstandard' is required for zstd files.")
+    if "r" in mode:
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(fileobj), buffer_size
+        )
+    return zstandard.ZstdCompressor().stream_writer(fileobj)
+
+def open_file(path, mode='r'):
+    # Open plain or compressed files, or stdin/stdout for "-", in text or
+    # binary mode with large buffers
+    reading = "r" in mode
+    binary_mode = mode.replace("t", "").replace("b", "") + "b"
+
+    if path == "-":
+        fileobj = open(
+            sys.stdin.fileno() if reading else sys.stdout.fileno(),
+            binary_mode, buffering=buffer_size, closefd=False
+        )
+        head = fileobj.peek(6)[:6] if reading else b""
+    else:
+        fileobj = None
+        head = b""
+        if reading:
+            with open(path, 'rb') as f:
+                head = f.read(6)
+    compression = detect_compression(path, head)
+
+    if compression is None:
+        if fileobj is None:
+            fileobj = open(path, binary_mode, buffering=buffer_size)
+        stream = fileobj
+    elif compression == "zstd":
+        if fileobj is None:
+            fileobj = open(path, binary_mode, buffering=buffer_size)
+        stream = open_zstd(fileobj, binary_mode)
+    else:
+        opener = {"gzip" : gzip, "bz2" : bz2, "xz" : lzma}[compression]
+        if fileobj is None:
+            stream = opener.open(path, binary_mode)
+        else:
+            stream = opener.open(fileobj, binary_mode)
+        if reading:
+            stream = io.BufferedReader(stream, buffer_size)
+
+    if "b" in mode:
+        return stream
+    return io.TextIOWrapper(stream, write_through=False)
+
+def test_open_file():
+    tmp_dir = tempfile.mkdtemp()
+    text = "Compound ID,nH,charge,dG0_f\nC00001,2,0,-237.19\n"
+    for name in ["a.csv", "a.csv.gz", "a.csv.bz2", "a.csv.xz"]:
+        path = os.path.join(tmp_dir, name)
+        with open_file(path, 'w') as f:
+            f.write(text)
+        assert open_file(path).read() == text
+        assert open_file(path).readlines() == text.splitlines(True)
+        # Compression is recognized from the content, not only the extension
+        renamed = path + ".renamed"
+        os.rename(path, renamed)
+        assert open_file(renamed).read() == text
+        os.remove(renamed)
+    os.rmdir(tmp_dir)
+
+
+def file_signature(path):
+    # Identify a file by path, modification time and size, so that cached
+    # tables are reloaded when the file changes
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
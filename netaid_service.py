@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from functools import lru_cache
+
+from netaid_io import file_signature, open_file
+
+# Specify path to repository
+global repo_dir
+repo_dir = os.path.dirname(__file__)
+
+# Notices of the request handled by each server thread
+global notice_buffers
+notice_buffers = threading.local()
+
+# Define functions; the formatter modules are imported where they are used,
+# so that the client does not load them
+@lru_cache(maxsize=32)
+def cached_name_kegg_dict(signature):
+    import model_format
+    return model_format.read_name_kegg_dict(signature[0])
+
+@lru_cache(maxsize=32)
+def cached_kegg_name_dict(signature):
+    import extract_concentrations
+    return extract_concentrations.read_kegg_name_dict(signature[0])
+
+@lru_cache(maxsize=32)
+def cached_net_kegg_dict(signature):
+    import extract_concentrations
+    return extract_concentrations.read_net_kegg_dict(signature[0])
+
+@lru_cache(maxsize=8)
+def cached_net_thermo_lines(signature):
+    import thermo_format
+    return "".join(
+        thermo_format.format_thermo_lines(open_file(signature[0]).readlines())
+    )
+
+@lru_cache(maxsize=8)
+def cached_thermo_dict(signature):
+    import exp_thermo_format
+    return exp_thermo_format.format_thermo_lines(
+        open_file(signature[0]).readlines()
+    )
+
+@lru_cache(maxsize=64)
+def cached_net_reactions(signature, single):
+    import match_reactions
+    return match_reactions.read_net_reactions(
+        open_file(signature[0], 'r').readlines(), single
+    )
+
+@lru_cache(maxsize=200000)
+def cached_reformat_reaction(equation, signature, cm_items):
+    import model_format
+    return model_format.reformat_reaction(
+        equation, cached_name_kegg_dict(signature), dict(cm_items)
+    )
+
+def format_model(args):
+    import model_format
+    signature = file_signature(args["metabolites"])
+    reaction_dict = model_format.read_reaction_dict(
+        args["reactions"], args.get("minimize")
+    )
+    compartment_description = [
+        L.split("\t") for L in open_file(args["compartments"], 'r').readlines()
+    ]
+    if args.get("biomass"):
+        biomass_equation = open_file(args["biomass"], 'r').read().strip()
+    else:
+        biomass_equation = None
+
+    # Reformat reactions through the cache shared by all requests
+    def reformat(equation, name_kegg_dict, compartment_dict):
+        return cached_reformat_reaction(
+            equation, signature, tuple(sorted(compartment_dict.items()))
+        )
+
+    with open_file(args["outfile"], 'w') as f:
+        model_format.write_model(
+            f, cached_name_kegg_dict(signature), reaction_dict,
+            compartment_description, biomass_equation, reformat
+        )
+
+def format_thermo(args):
+    with open_file(args["outfile"], 'w') as outfile:
+        outfile.write(cached_net_thermo_lines(file_signature(args["infile"])))
+
+def format_experimental(args):
+    import exp_thermo_format
+    ther_dict = cached_thermo_dict(file_signature(args["thermo"]))
+    meta_dict = exp_thermo_format.net_model_to_metabolite_dict(
+        open_file(args["model"]).read()
+    )
+    conc_text = open_file(args["concentrations"]).read()
+    rats_list = [x.strip() for x in open_file(args["ratios"]).readlines()]
+    flux_list = [x.strip().split("\t") for x in open_file(args["fluxes"]).readlines()]
+    x_out, t_out = exp_thermo_format.format_experimental(
+        ther_dict, meta_dict, conc_text, rats_list, flux_list
+    )
+    with open_file(args["experimental"], 'w') as x:
+        x.write(x_out)
+    with open_file(args["out_thermo"], 'w') as t:
+        t.write(t_out)
+
+def extract(args):
+    import extract_concentrations
+    kegg_name_dict = cached_kegg_name_dict(
+        file_signature(os.path.join(repo_dir, "data/keggid_keggname.tab"))
+    )
+    if args.get("names"):
+        net_kegg_dict = cached_net_kegg_dict(file_signature(args["names"]))
+    else:
+        net_kegg_dict = {}
+    with open_file(args["outfile"], 'w') as outfile:
+        outfile.write(extract_concentrations.extract_concentrations(
+            open_file(args["infile"]).read(), net_kegg_dict, kegg_name_dict,
+            args.get("label")
+        ))
+
+def match(args):
+    import match_reactions
+    single = bool(args.get("single"))
+    reactions_1 = cached_net_reactions(file_signature(args["infile1"]), single)
+    reactions_2 = cached_net_reactions(file_signature(args["infile2"]), single)
+    with open_file(args["outfile"], 'w') as outfile:
+        match_reactions.write_matches(
+            outfile, reactions_1, reactions_2, bool(args.get("approximate")),
+            args.get("jaccard", 0.7), args.get("top", 1)
+        )
+
+commands = {
+    "format-model" : format_model,
+    "format-thermo" : format_thermo,
+    "format-experimental" : format_experimental,
+    "extract-concentrations" : extract,
+    "match-reactions" : match
+}
+
+class NoticeStream:
+    # Standard error that goes to the notices of the request handled by the
+    # current thread, so that the client can print them
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = getattr(notice_buffers, "buffer", None)
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+def capture_notices():
+    if not isinstance(sys.stderr, NoticeStream):
+        sys.stderr = NoticeStream(sys.stderr)
+
+def run_command(request):
+    # Run one command and report errors back instead of stopping the server
+    try:
+        commands[request["command"]](request["args"])
+    except KeyError as e:
+        if request.get("command") not in commands:
+            return {"status" : "error", "message" : "Unknown command."}
+        return {"status" : "error", "message" : "KeyError: %s" % e}
+    except SystemExit as e:
+        return {"status" : "error", "message" : str(e)}
+    except Exception as e:
+        return {"status" : "error", "message" : "%s: %s" % (type(e).__name__, e)}
+    return {"status" : "ok"}
+
+def handle_request(request):
+    # Response of one command with its notices to stderr, if any
+    notice_buffers.buffer = io.StringIO()
+    try:
+        response = run_command(request)
+    finally:
+        notices = notice_buffers.buffer.getvalue()
+        notice_buffers.buffer = None
+    if notices:
+        response["notices"] = notices
+    return response
+
+def test_handle_request():
+    assert handle_request({"command" : "plot", "args" : {}}) == \
+        {"status" : "error", "message" : "Unknown command."}
+    outfile = tempfile.NamedTemporaryFile(suffix=".tsv", delete=False).name
+    request = {
+        "command" : "extract-concentrations",
+        "args" : {
+            "infile" : os.path.join(repo_dir, "data/example_net.csv"),
+            "label" : "Test", "outfile" : outfile
+        }
+    }
+    assert handle_request(request) == {"status" : "ok"}
+    assert handle_request(request) == {"status" : "ok"}
+    assert cached_kegg_name_dict.cache_info().hits >= 1
+    assert open(outfile).read().startswith("Label\tID\tName\t")
+    os.remove(outfile)
+
+    # Notices are returned instead of printed by the server
+    stderr = sys.stderr
+    capture_notices()
+    commands["notice"] = lambda args: print("Changed.", file=sys.stderr)
+    assert handle_request({"command" : "notice", "args" : {}}) == \
+        {"status" : "ok", "notices" : "Changed.\n"}
+    del commands["notice"]
+    sys.stderr = stderr
+
+
+def test_cached_reformat_reaction():
+    metabolites = tempfile.NamedTemporaryFile('w', suffix=".tab", delete=False)
+    metabolites.write("atp[c]\tC00002\nadp[c]\tC00008\nh[c]\tC00080\n")
+    metabolites.close()
+    signature = file_signature(metabolites.name)
+    cm_items = (("c", "c"),)
+    equation = "atp[c] -> adp[c] + h[c]"
+    assert cached_reformat_reaction(equation, signature, cm_items) == \
+        "[c]C00002 = C00008"
+    hits = cached_reformat_reaction.cache_info().hits
+    cached_reformat_reaction(equation, signature, cm_items)
+    assert cached_reformat_reaction.cache_info().hits == hits + 1
+    os.remove(metabolites.name)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, answered with one JSON response per line
+    def handle(self):
+        for line in self.rfile:
+            response = handle_request(json.loads(line))
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn,
+                          socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(socket_path):
+    # Load the formatter modules before the first request
+    import exp_thermo_format, extract_concentrations, match_reactions, \
+        model_format, thermo_format
+    capture_notices()
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with ThreadingUnixServer(socket_path, RequestHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+def request_paths(args):
+    # Paths as absolute paths, as the server has its own working directory;
+    # the server can not reach the client's stdin or stdout
+    piped = sorted([k for k in args if k in path_arguments and args[k] == "-"])
+    if piped:
+        sys.exit(
+            "Error: The service can not read or write stdin/stdout ('-'); " + \
+            "give file paths for: " + ", ".join(piped)
+        )
+    return dict([
+        (k, os.path.abspath(v) if k in path_arguments and v is not None else v)
+        for k, v in args.items()
+    ])
+
+def test_request_paths():
+    args = request_paths({"infile" : "a.csv", "label" : "-", "names" : None})
+    assert args == {
+        "infile" : os.path.abspath("a.csv"), "label" : "-", "names" : None
+    }
+    try:
+        request_paths({"infile" : "a.csv", "outfile" : "-"})
+        assert False
+    except SystemExit as e:
+        assert str(e).endswith("give file paths for: outfile")
+
+
+def send_request(socket_path, command, args):
+    args = request_paths(args)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(socket_path)
+        s.sendall((json.dumps({"command" : command, "args" : args}) + "\n").encode())
+        response = s.makefile().readline()
+    return json.loads(response)
+
+path_arguments = {
+    "metabolites", "reactions", "compartments", "biomass", "minimize",
+    "outfile", "infile", "model", "thermo", "concentrations", "ratios",
+    "fluxes", "experimental", "out_thermo", "names", "infile1", "infile2"
+}
+
+
+# Main code block
+
+def main(socket_path, command, args):
+    if command == "serve":
+        serve(socket_path)
+        return
+    response = send_request(socket_path, command, args)
+    sys.stderr.write(response.get("notices", ""))
+    if response["status"] != "ok":
+        sys.exit("Error: " + response["message"])
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Options: Server socket
+    parser.add_argument(
+        '-s', '--socket',
+        default=os.path.join(tempfile.gettempdir(), "netaid.sock"),
+        help='Unix socket of the NETAID service.'
+    )
+
+    # Commands: Start the server or send a request with the script arguments
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser(
+        'serve', help='Start the NETAID service.'
+    )
+
+    sp = subparsers.add_parser(
+        'format-model', help='Run model_format.py through the service.'
+    )
+    sp.add_argument('-m', '--metabolites', required=True)
+    sp.add_argument('-r', '--reactions', required=True)
+    sp.add_argument('-c', '--compartments', required=True)
+    sp.add_argument('-b', '--biomass')
+    sp.add_argument('-z', '--minimize')
+    sp.add_argument('-o', '--outfile', required=True)
+
+    sp = subparsers.add_parser(
+        'format-thermo', help='Run thermo_format.py through the service.'
+    )
+    sp.add_argument('infile')
+    sp.add_argument('outfile')
+
+    sp = subparsers.add_parser(
+        'format-experimental',
+        help='Run exp_thermo_format.py through the service.'
+    )
+    sp.add_argument('-m', '--model')
+    sp.add_argument('-t', '--thermo')
+    sp.add_argument('-c', '--concentrations')
+    sp.add_argument('-r', '--ratios')
+    sp.add_argument('-f', '--fluxes')
+    sp.add_argument('-e', '--experimental')
+    sp.add_argument('-o', '--out_thermo')
+
+    sp = subparsers.add_parser(
+        'extract-concentrations',
+        help='Run extract_concentrations.py through the service.'
+    )
+    sp.add_argument('-i', '--infile')
+    sp.add_argument('-n', '--names')
+    sp.add_argument('-l', '--label')
+    sp.add_argument('-o', '--outfile')
+
+    sp = subparsers.add_parser(
+        'match-reactions', help='Run match_reactions.py through the service.'
+    )
+    sp.add_argument('infile1')
+    sp.add_argument('infile2')
+    sp.add_argument('-s', '--single', action='store_true')
+    sp.add_argument('-a', '--approximate', action='store_true')
+    sp.add_argument('-j', '--jaccard', type=float, default=0.7)
+    sp.add_argument('-k', '--top', type=int, default=1)
+    sp.add_argument('outfile')
+
+    args = parser.parse_args()
+
+    # Run main function
+    command_args = dict([
+        (k, v) for k, v in vars(args).items() if k not in ("socket", "command")
+    ])
+    main(args.socket, args.command, command_args)
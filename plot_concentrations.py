@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import io
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from netaid_io import open_file
+
+# Define functions
+def read_concentration_table(concentration_text):
+    # Parse extract_concentrations output into one row per range bar
+    rows = []
+    header = None
+    for line in concentration_text.split("\n"):
+        if not line.strip():
+            # Skip empty line
+            continue
+        line = line.split("\t")
+        if header is None:
+            header = line
+            continue
+        record = dict(zip(header, line))
+        metabolite = record["Name"] + " [" + record["Compartment"] + "]"
+        for source, lo, hi in [
+            ("Bounds", "LowIn", "HighIn"), ("NET-opt.", "LowOut", "HighOut")
+        ]:
+            # Change from mM to M
+            rows.append({
+                "Metabolite" : metabolite, "Label" : record["Label"],
+                "Source" : source, "Lower" : float(record[lo]) / 1000,
+                "Upper" : float(record[hi]) / 1000
+            })
+    return rows
+
+def test_read_concentration_table():
+    concentration_text = "\n".join([
+        "\t".join(["Label", "ID", "Name", "Compartment", "KEGGID",
+                   "LowIn", "HighIn", "LowOut", "HighOut"]),
+        "\t".join(["Test", "g6p", "D-Glucose 6-phosphate", "c", "C00092",
+                   "0.0001", "0.528", "0.337486", "0.5279"]),
+        ""
+    ])
+    exp_rows = [
+        {"Metabolite" : "D-Glucose 6-phosphate [c]", "Label" : "Test",
+         "Source" : "Bounds", "Lower" : 0.0001 / 1000, "Upper" : 0.528 / 1000},
+        {"Metabolite" : "D-Glucose 6-phosphate [c]", "Label" : "Test",
+         "Source" : "NET-opt.", "Lower" : 0.337486 / 1000,
+         "Upper" : 0.5279 / 1000}
+    ]
+    assert read_concentration_table(concentration_text) == exp_rows
+
+
+def split_pages(rows, per_page):
+    # Group rows by metabolite in alphabetical order and cut into pages
+    metabolites = sorted(set([row["Metabolite"] for row in rows]))
+    pages = []
+    for i in range(0, len(metabolites), per_page):
+        page_metabolites = set(metabolites[i:i + per_page])
+        pages.append(
+            [row for row in rows if row["Metabolite"] in page_metabolites]
+        )
+    return pages
+
+def test_split_pages():
+    rows = [
+        {"Metabolite" : m, "Label" : l, "Source" : "Bounds",
+         "Lower" : 1e-6, "Upper" : 1e-3}
+        for m in ["c [c]", "a [c]", "b [c]"] for l in ["A", "B"]
+    ]
+    pages = split_pages(rows, 2)
+    assert len(pages) == 2
+    assert [row["Metabolite"] for row in pages[0]] == \
+        ["a [c]", "a [c]", "b [c]", "b [c]"]
+    assert [(row["Metabolite"], row["Label"]) for row in pages[1]] == \
+        [("c [c]", "A"), ("c [c]", "B")]
+
+
+def render_page(page, labels, limits, ncol=3):
+    # Draw one page of range bars and return it as single-page PDF bytes
+    metabolites = sorted(set([row["Metabolite"] for row in page]))
+    nrow = -(-len(metabolites) // ncol)
+
+    # Calculate height of page as for the single-page plot
+    height_mm = 20 + (10 + 5 * len(labels)) * nrow
+    fig, axes = plt.subplots(
+        nrow, ncol, sharex=True, squeeze=False,
+        figsize=(210 / 25.4, height_mm / 25.4)
+    )
+    colors = plt.get_cmap("Paired").colors
+    linestyles = {"Bounds" : "solid", "NET-opt." : "dashed"}
+    offsets = {"Bounds" : -0.15, "NET-opt." : 0.15}
+
+    for i, ax in enumerate(axes.flat):
+        if i >= len(metabolites):
+            ax.set_axis_off()
+            continue
+        metabolite = metabolites[i]
+        for row in page:
+            if row["Metabolite"] != metabolite:
+                continue
+            y = labels.index(row["Label"]) + offsets[row["Source"]]
+            color = colors[labels.index(row["Label"]) % len(colors)]
+            ax.hlines(
+                y, row["Lower"], row["Upper"], color=color,
+                linestyle=linestyles[row["Source"]], linewidth=1
+            )
+            ax.plot(
+                [row["Lower"], row["Upper"]], [y, y], linestyle="",
+                marker="|", color=color, markersize=6
+            )
+        for reference in (1e-7, 0.1):
+            ax.axvline(reference, linestyle="dashed", color="grey", linewidth=0.8)
+        ax.set_xscale("log")
+        ax.set_xlim(limits)
+        ax.set_ylim(-0.6, len(labels) - 0.4)
+        ax.set_yticks(range(len(labels)))
+        ax.set_yticklabels(labels, fontsize=7)
+        ax.set_title(metabolite, fontsize=7)
+        ax.tick_params(axis="x", labelsize=7, labelrotation=90)
+    for ax in axes[-1]:
+        ax.set_xlabel("Concentration range (M)", fontsize=8)
+
+    # Legend with labels in reverse order, and one entry per source
+    handles = [
+        plt.Line2D([], [], color=colors[labels.index(l) % len(colors)], label=l)
+        for l in reversed(labels)
+    ] + [
+        plt.Line2D([], [], color="black", linestyle=linestyles[s], label=s)
+        for s in linestyles
+    ]
+    fig.legend(handles=handles, loc="center right", fontsize=7, frameon=False)
+    fig.tight_layout(rect=(0, 0, 0.82, 1))
+
+    pdf = io.BytesIO()
+    fig.savefig(pdf, format="pdf")
+    plt.close(fig)
+    return pdf.getvalue()
+
+def render_page_star(args):
+    return render_page(*args)
+
+
+# Main code block
+
+def main(infiles, outfile_name, per_page, processes):
+
+    # Check that the outfile is pdf
+    if outfile_name != "-" and not outfile_name.endswith("pdf"):
+        sys.exit("Error: Outfile must end with 'pdf'.")
+
+    # Read data
+    rows = []
+    for infile in infiles:
+        rows.extend(read_concentration_table(open_file(infile).read()))
+
+    # Labels in order of appearance and common concentration axis
+    labels = []
+    for row in rows:
+        if row["Label"] not in labels:
+            labels.append(row["Label"])
+    values = [v for row in rows for v in (row["Lower"], row["Upper"]) if v > 0]
+    limits = (min(values + [1e-7]) / 2, max(values + [0.1]) * 2)
+
+    # Render pages in parallel and combine them into one document
+    pages = split_pages(rows, per_page)
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        sys.exit(
+            "Error: Python module 'pypdf' is required to combine the pages."
+        )
+    writer = PdfWriter()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for page_pdf in executor.map(
+            render_page_star, [(page, labels, limits) for page in pages]
+        ):
+            writer.append(PdfReader(io.BytesIO(page_pdf)))
+    with open_file(outfile_name, 'wb') as outfile:
+        writer.write(outfile)
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: Concentration range files from extract_concentrations.py
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read tab-delimited concentration range files.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-n', '--per_page', type=int, default=30,
+        help='Number of metabolites per page [30].'
+    )
+    parser.add_argument(
+        '-p', '--processes', type=int, default=None,
+        help='Number of worker processes [all CPUs].'
+    )
+
+    # Output: Multi-page pdf with concentration ranges
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write concentration range plot to pdf outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.infiles, args.outfile, args.per_page, args.processes)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+
+from match_reactions import read_net_reactions
+from netaid_io import open_file
+from reaction_energies import model_bounds, read_concentration_bounds, \
+    reaction_energy_bounds, species_formation_energies, stoichiometric_matrix
+from sample_concentrations import read_flux_directions
+from transform_thermo import R, T, read_compartments
+
+# Define functions
+def propagate_bounds(S, drG0, directions, ln_lo, ln_hi, max_iterations,
+                     time_budget):
+    # Feasibility-based bound tightening of the log-concentrations (M) with
+    # d (drG0 + RT S^T x) <= 0 for every directed reaction; each iteration
+    # updates all bounds at once from the smallest left-hand side of every
+    # constraint without the bounded species
+    constrained = np.flatnonzero((directions != 0) & np.isfinite(drG0))
+    A = S[:, constrained].T.multiply(
+        (directions[constrained] * R * T)[:, None]
+    ).tocoo()
+    b = -directions[constrained] * drG0[constrained]
+    rows, cols, a = A.row, A.col, A.data
+    positive = a > 0
+    lo = np.array(ln_lo, dtype=float)
+    hi = np.array(ln_hi, dtype=float)
+
+    def activities(lo, hi):
+        contributions = np.where(positive, a * lo[cols], a * hi[cols])
+        return (
+            contributions,
+            np.bincount(rows, weights=contributions, minlength=len(b))
+        )
+
+    start = time.time()
+    iterations = 0
+    while iterations < max_iterations and \
+        time.time() - start < time_budget:
+        contributions, activity = activities(lo, hi)
+        if (activity > b + 1e-6).any() or (lo > hi + 1e-9).any():
+            break
+        iterations += 1
+        bounds = (b[rows] - activity[rows] + contributions) / a
+        new_lo = lo.copy()
+        new_hi = hi.copy()
+        np.minimum.at(new_hi, cols[positive], bounds[positive])
+        np.maximum.at(new_lo, cols[~positive], bounds[~positive])
+        change = max(
+            np.max(hi - new_hi, initial=0), np.max(new_lo - lo, initial=0)
+        )
+        lo, hi = new_lo, new_hi
+        if change < 1e-9:
+            break
+
+    # Contradictions: reactions that can not run in their direction, and
+    # species with an empty range
+    contributions, activity = activities(lo, hi)
+    infeasible_reactions = constrained[activity > b + 1e-6]
+    infeasible_species = np.flatnonzero(lo > hi + 1e-9)
+    return (lo, hi, iterations, infeasible_reactions, infeasible_species)
+
+def test_propagate_bounds():
+    # A -> B -> C with zero standard reaction energies orders A >= B >= C
+    S = sparse.csr_matrix(np.array([[-1, 0], [1, -1], [0, 1]]))
+    drG0 = np.zeros(2)
+    directions = np.array([1, 1])
+    ln_lo = np.log([1e-4, 1e-7, 1e-5])
+    ln_hi = np.log([1e-3, 1e-2, 1e-2])
+    lo, hi, iterations, reactions, species = propagate_bounds(
+        S, drG0, directions, ln_lo, ln_hi, 100, 10
+    )
+    assert np.allclose(np.exp(hi), [1e-3, 1e-3, 1e-3])
+    assert np.allclose(np.exp(lo), [1e-4, 1e-5, 1e-5])
+    assert len(reactions) == 0 and len(species) == 0
+
+    # A measured C above the highest A is a contradiction
+    ln_lo[2] = np.log(5e-3)
+    lo, hi, iterations, reactions, species = propagate_bounds(
+        S, drG0, directions, ln_lo, ln_hi, 100, 10
+    )
+    assert len(reactions) + len(species) > 0
+
+    # Undirected reactions do not constrain
+    lo, hi, iterations, reactions, species = propagate_bounds(
+        S, drG0, np.array([0, 0]), ln_lo, ln_hi, 100, 10
+    )
+    assert iterations == 1 and np.array_equal(hi, ln_hi)
+
+
+def seed_experimental_lines(experimental_text, species, lo, hi, tight_lo,
+                            tight_hi):
+    # Experimental file with tightened bounds (mM) for single metabolites;
+    # other species follow the last metabolite line if propagation changed
+    # their bounds, except water, which is only written when measured
+    lines = experimental_text.rstrip("\n").split("\n")
+    index = dict([(x, i) for i, x in enumerate(species)])
+    seen = set()
+    last = max([
+        i for i, line in enumerate(lines) if line.startswith("metabolite;")
+    ] + [0])
+    for i, line in enumerate(lines):
+        fields = line.split(";")
+        if fields[0] == "metabolite" and fields[1] in index:
+            k = index[fields[1]]
+            fields[2:4] = ["%.6g" % tight_lo[k], "%.6g" % tight_hi[k]]
+            lines[i] = ";".join(fields)
+            seen.add(fields[1])
+    new_lines = []
+    for x, k in index.items():
+        bounds = ["%.6g" % tight_lo[k], "%.6g" % tight_hi[k]]
+        if x in seen or x.startswith("C00001[") or \
+            bounds == ["%.6g" % lo[k], "%.6g" % hi[k]]:
+            continue
+        new_lines.append(";".join(["metabolite", x] + bounds + ["", "", ""]))
+    return lines[:last + 1] + new_lines + lines[last + 1:]
+
+def test_seed_experimental_lines():
+    experimental_text = "\n".join([
+        ";Metabolite;Lowest Concentration;Highest Concentration;;;",
+        "metabolite;C00002[c];1.0;10.0;;;",
+        "metabolite;C00002[c] + C00008[c];0.1;10;;;",
+        "",
+        ";ID;direction;",
+        "flux;HEX1;1"
+    ])
+
+    # C00008 keeps its default bounds and water is not measured
+    species = ["C00002[c]", "C00092[c]", "C00008[c]", "C00001[c]"]
+    lines = seed_experimental_lines(
+        experimental_text, species,
+        np.array([1.0, 0.0001, 0.0001, 1000]), np.array([10, 10, 10, 1000]),
+        np.array([2.0, 0.0001, 0.0001, 1000]), np.array([10, 0.25, 10, 500])
+    )
+    assert lines[1:4] == [
+        "metabolite;C00002[c];2;10;;;",
+        "metabolite;C00002[c] + C00008[c];0.1;10;;;",
+        "metabolite;C00092[c];0.0001;0.25;;;"
+    ]
+    assert lines[4] == ""
+    assert lines[-1] == "flux;HEX1;1"
+
+
+# Main code block
+
+def main(model, thermo, experimental, fluxes, default_bounds, max_iterations,
+         time_budget, seed, outfile_name):
+
+    # Read model, thermodynamics, concentration bounds and flux directions
+    net_model_text = open_file(model).read()
+    experimental_text = open_file(experimental).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+    lo, hi = model_bounds(
+        species, read_concentration_bounds(experimental_text), default_bounds
+    )
+    given = read_flux_directions(experimental_text)
+    if fluxes:
+        for line in open_file(fluxes).read().split("\n"):
+            if line.strip():
+                line = line.strip().split("\t")
+                given[line[0]] = int(float(line[1]))
+
+    # Transported protons are not in the model reactions, so the energies of
+    # multi-compartment reactions are incomplete; they do not constrain
+    directions = np.array([
+        given.get(rxn_id, 0) if reactions[rxn_id].startswith("[") else 0
+        for rxn_id in reaction_ids
+    ])
+
+    drG0 = S.T @ dfG_prime
+    ln_lo, ln_hi, iterations, infeasible_reactions, infeasible_species = \
+        propagate_bounds(
+            S, drG0, directions, np.log(lo / 1000), np.log(hi / 1000),
+            max_iterations, time_budget
+        )
+    tight_lo = np.exp(ln_lo) * 1000
+    tight_hi = np.exp(ln_hi) * 1000
+    drG0, drG_min, drG_max = reaction_energy_bounds(
+        S, dfG_prime, tight_lo, np.maximum(tight_lo, tight_hi)
+    )
+
+    # Directed reactions are limited to their side of zero
+    drG_max = np.where(directions > 0, np.minimum(drG_max, 0), drG_max)
+    drG_min = np.where(directions < 0, np.maximum(drG_min, 0), drG_min)
+
+    status = "infeasible" if len(infeasible_reactions) or \
+        len(infeasible_species) else "feasible"
+    for i in infeasible_reactions:
+        print(
+            "Contradiction: " + reaction_ids[i] + " can not run in direction " + \
+            str(directions[i]), file=sys.stderr
+        )
+    for i in infeasible_species:
+        print(
+            "Contradiction: empty concentration range for " + species[i],
+            file=sys.stderr
+        )
+
+    # Write status, tightened concentrations (mM) and reaction energies
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("Status\t" + status + "\n")
+        outfile.write("Iterations\t" + str(iterations) + "\n")
+        outfile.write("\n")
+        outfile.write("\t".join([
+            "KEGGID", "Compartment", "Low", "High", "TightLow", "TightHigh"
+        ]) + "\n")
+        for i, metabolite in enumerate(species):
+            kegg_id, compartment = metabolite.rstrip("]").split("[")
+            outfile.write("\t".join([kegg_id, compartment] + [
+                "%.6g" % v for v in (lo[i], hi[i], tight_lo[i], tight_hi[i])
+            ]) + "\n")
+        outfile.write("\n")
+        outfile.write("\t".join([
+            "ID", "Direction", "drG0_prime", "drG_prime_min", "drG_prime_max",
+            "Contradiction"
+        ]) + "\n")
+        for i, rxn_id in enumerate(reaction_ids):
+            outfile.write("\t".join([rxn_id, str(directions[i])] + [
+                str(round(v, 4)) for v in (drG0[i], drG_min[i], drG_max[i])
+            ] + [str(int(i in infeasible_reactions))]) + "\n")
+
+    # Write experimental file with tightened bounds
+    if seed:
+        with open_file(seed, 'w') as outfile:
+            outfile.write("\n".join(seed_experimental_lines(
+                experimental_text, species, lo, hi, tight_lo, tight_hi
+            )) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data, experimental data, fluxes
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+    parser.add_argument(
+        '-x', '--experimental', required=True,
+        help='Read experimental data file.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with known directions.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-d', '--default_bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Concentration bounds (mM) of unmeasured metabolites [0.0001 10].'
+    )
+    parser.add_argument(
+        '-i', '--iterations', type=int, default=1000,
+        help='Maximum number of propagation rounds [1000].'
+    )
+    parser.add_argument(
+        '-s', '--seconds', type=float, default=1.0,
+        help='Time budget for propagation in seconds [1].'
+    )
+
+    # Output: Tightened bounds, experimental file with tightened bounds
+    parser.add_argument(
+        '-e', '--seed',
+        help='Write experimental data file with tightened bounds.'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write tightened bounds and contradictions to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.experimental, args.fluxes,
+        args.default_bounds, args.iterations, args.seconds, args.seed,
+        args.outfile
+    )
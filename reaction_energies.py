@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+
+import numpy as np
+from scipy import sparse
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+from transform_thermo import R, T, formation_energies, read_compartments
+
+# Define functions
+def stoichiometric_matrix(reactions):
+    # Sparse metabolite-by-reaction matrix; the biomass reaction is left out
+    species_index = {}
+    reaction_ids = []
+    rows = []
+    cols = []
+    values = []
+    for rxn_id in reactions:
+        if rxn_id == "Biomass" or not reactions[rxn_id]:
+            continue
+        stoichiometry = reaction_stoichiometry(reactions[rxn_id])
+        for metabolite in stoichiometry:
+            if metabolite not in species_index:
+                species_index[metabolite] = len(species_index)
+            rows.append(species_index[metabolite])
+            cols.append(len(reaction_ids))
+            values.append(stoichiometry[metabolite])
+        reaction_ids.append(rxn_id)
+    species = sorted(species_index, key = lambda x: species_index[x])
+    S = sparse.csr_matrix(
+        (values, (rows, cols)), shape=(len(species), len(reaction_ids))
+    )
+    return (species, reaction_ids, S)
+
+def test_stoichiometric_matrix():
+    reactions = {
+        "HEX1" : "[c]C00002 + C00031 = C00008 + C00092",
+        "GLCt" : "C00031[e] = C00031[c]",
+        "Biomass" : "C00002 = C00008"
+    }
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    assert species == [
+        "C00002[c]", "C00031[c]", "C00008[c]", "C00092[c]", "C00031[e]"
+    ]
+    assert reaction_ids == ["HEX1", "GLCt"]
+    assert S.toarray().tolist() == [
+        [-1, 0], [-1, 1], [1, 0], [1, 0], [0, -1]
+    ]
+
+
+def species_formation_energies(species, thermo, compartments):
+    # Transformed formation energy of each species at its compartment pH/IS;
+    # the energies of all compounds are looked up once per distinct pH/IS
+    dfG_prime = np.full(len(species), np.nan)
+    energies = {}
+    for i, metabolite in enumerate(species):
+        kegg_id, compartment = metabolite.rstrip("]").split("[")
+        pH, IS = compartments[compartment]
+        if (pH, IS) not in energies:
+            energies[(pH, IS)] = formation_energies(thermo, pH, IS)
+        dfG_prime[i] = energies[(pH, IS)].get(kegg_id, np.nan)
+    return dfG_prime
+
+def read_concentration_bounds(experimental_text):
+    # Concentration bounds (mM) of single metabolites in the experimental file
+    bounds = {}
+    for line in experimental_text.split("\n"):
+        if not line.startswith("metabolite;"):
+            continue
+        line = line.split(";")
+        if " " in line[1]:
+            # Skip sums and ratios
+            continue
+        bounds[line[1]] = (float(line[2]), float(line[3]))
+    return bounds
+
+def test_read_concentration_bounds():
+    experimental_text = "\n".join([
+        ";Metabolite;Lowest Concentration;Highest Concentration;;;",
+        "metabolite;C00001[c];1000.0;1000.0;;;",
+        "metabolite;C00002[c];1.0;10.0;;;",
+        "metabolite;C00002[c] + C00008[c];0.1;10;;;",
+        "",
+        ";ID;direction;",
+        "flux;HEX1;1"
+    ])
+    assert read_concentration_bounds(experimental_text) == {
+        "C00001[c]" : (1000.0, 1000.0), "C00002[c]" : (1.0, 10.0)
+    }
+
+
+def reaction_energy_bounds(S, dfG_prime, lo, hi):
+    # Standard transformed reaction energies in one sparse product, and the
+    # best and worst case given log-concentration bounds (M); bounds may
+    # also be given as one column per scenario
+    drG0 = S.T @ dfG_prime
+    S_pos = S.maximum(0)
+    S_neg = S.minimum(0)
+    ln_lo = np.log(lo / 1000)
+    ln_hi = np.log(hi / 1000)
+    offset = drG0 if np.ndim(lo) == 1 else drG0[:, None]
+    drG_min = offset + R * T * (S_pos.T @ ln_lo + S_neg.T @ ln_hi)
+    drG_max = offset + R * T * (S_pos.T @ ln_hi + S_neg.T @ ln_lo)
+    return (drG0, drG_min, drG_max)
+
+def test_reaction_energy_bounds():
+    S = sparse.csr_matrix(np.array([[-1, 0], [1, -1], [0, 1]], dtype=float))
+    dfG_prime = np.array([-10.0, -20.0, np.nan])
+    lo = np.array([1.0, 0.1, 1.0])
+    hi = np.array([1.0, 10.0, 1.0])
+    drG0, drG_min, drG_max = reaction_energy_bounds(S, dfG_prime, lo, hi)
+    RT = R * T
+    assert np.allclose(drG0[0], -10.0)
+    assert np.allclose(drG_min[0], -10.0 + RT * np.log(0.1 / 1000 / (1 / 1000)))
+    assert np.allclose(drG_max[0], -10.0 + RT * np.log(10 / 1000 / (1 / 1000)))
+    assert np.isnan(drG0[1]) and np.isnan(drG_max[1])
+
+    # Several scenarios at once
+    drG0, drG_min_2, drG_max_2 = reaction_energy_bounds(
+        S, dfG_prime, np.c_[lo, lo], np.c_[hi, hi]
+    )
+    assert drG_min_2.shape == (2, 2)
+    assert np.allclose(drG_min_2[0], drG_min[0])
+
+
+def assign_directions(drG_min, drG_max):
+    # Irreversible when the reaction energy interval has one sign
+    directions = np.zeros(len(drG_min), dtype=int)
+    directions[drG_max < 0] = 1
+    directions[drG_min > 0] = -1
+    return directions
+
+def test_assign_directions():
+    drG_min = np.array([-30.0, 5.0, -5.0, np.nan])
+    drG_max = np.array([-1.0, 20.0, 5.0, np.nan])
+    assert assign_directions(drG_min, drG_max).tolist() == [1, -1, 0, 0]
+
+
+def model_bounds(species, bounds, default_bounds):
+    # Bounds for every species; water is at unit activity unless measured
+    lo = np.full(len(species), default_bounds[0], dtype=float)
+    hi = np.full(len(species), default_bounds[1], dtype=float)
+    for i, metabolite in enumerate(species):
+        if metabolite in bounds:
+            lo[i], hi[i] = bounds[metabolite]
+        elif metabolite.startswith("C00001["):
+            lo[i], hi[i] = (1000.0, 1000.0)
+    return (lo, hi)
+
+
+# Main code block
+
+def main(model, thermo, experimental, fluxes, default_bounds, energies,
+         outfile_name):
+
+    # Read model, thermodynamics and concentration bounds
+    net_model_text = open_file(model).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+    lo, hi = model_bounds(
+        species, read_concentration_bounds(open_file(experimental).read()),
+        default_bounds
+    )
+
+    # Compute reaction energy intervals and directions
+    drG0, drG_min, drG_max = reaction_energy_bounds(S, dfG_prime, lo, hi)
+    directions = assign_directions(drG_min, drG_max)
+
+    # Transported protons are not in the model reactions, so the energies of
+    # multi-compartment reactions are incomplete; leave their direction open
+    single_compartment = np.array([
+        reactions[rxn_id].startswith("[") for rxn_id in reaction_ids
+    ])
+    directions[~single_compartment] = 0
+
+    # Write reaction energies
+    if energies:
+        with open_file(energies, 'w') as outfile:
+            outfile.write("\t".join(
+                ["ID", "drG0_prime", "drG_prime_min", "drG_prime_max",
+                 "direction"]
+            ) + "\n")
+            for i, rxn_id in enumerate(reaction_ids):
+                outfile.write("\t".join([rxn_id] + [
+                    str(round(x, 4)) for x in (drG0[i], drG_min[i], drG_max[i])
+                ] + [str(directions[i])]) + "\n")
+
+    # Write flux directions, keeping the given ones and adding those fixed by
+    # thermodynamics
+    flux_list = []
+    if fluxes:
+        flux_list = [
+            x.strip().split("\t") for x in open_file(fluxes).readlines() if x.strip()
+        ]
+    given = set([x[0] for x in flux_list])
+    for i, rxn_id in enumerate(reaction_ids):
+        if directions[i] and rxn_id not in given:
+            flux_list.append([rxn_id, str(directions[i])])
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("".join(["\t".join(x) + "\n" for x in flux_list]))
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data, experimental data, fluxes
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+    parser.add_argument(
+        '-x', '--experimental', required=True,
+        help='Read experimental data file.'
+    )
+    parser.add_argument(
+        '-f', '--fluxes',
+        help='Read tab-delimited fluxes file with known directions.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-d', '--default_bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Concentration bounds (mM) of unmeasured metabolites [0.0001 10].'
+    )
+
+    # Output: Reaction energies, direction-annotated fluxes
+    parser.add_argument(
+        '-g', '--energies',
+        help='Write tab-delimited reaction energies.'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write tab-delimited fluxes file with directions.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.experimental, args.fluxes,
+        args.default_bounds, args.energies, args.outfile
+    )
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import sys
+
+import numpy as np
+
+from extract_concentrations import read_net_kegg_dict
+from ingest_results import net_output_sections, parse_concentrations
+from match_reactions import read_net_reactions
+from netaid_io import open_file
+from reaction_energies import model_bounds, reaction_energy_bounds, \
+    species_formation_energies, stoichiometric_matrix
+from transform_thermo import read_compartments
+
+# Define functions
+def run_concentration_bounds(sections, net_kegg_dict):
+    # Optimized concentration ranges (mM) by species from one NET output
+    bounds = {}
+    for row in parse_concentrations(sections.get("CONCENTRATIONS", [])):
+        metabolite, compartment, dfG, range_min, range_max, \
+            optim_min, optim_max = row
+        if compartment is None:
+            # Skip sums and ratios
+            continue
+        if optim_min is None or optim_max is None:
+            optim_min, optim_max = range_min, range_max
+        if optim_min is None or optim_max is None:
+            continue
+        species = net_kegg_dict.get(metabolite, metabolite) + \
+            "[" + compartment + "]"
+        bounds[species] = (optim_min, optim_max)
+    return bounds
+
+def format_value(value):
+    return "NaN" if np.isnan(value) else str(round(value, 4))
+
+def thermodynamic_data_lines(reaction_ids, equations, drG_min, drG_max,
+                             sections):
+    # THERMODYNAMIC DATA layout; direction columns come from the NET output
+    # for the reactions of the reduced model and are 0 otherwise. Transported
+    # protons and the membrane potential are not in the model reactions, so
+    # multi-compartment reactions get no interval
+    reported = dict([
+        (line.split(";")[0], line.split(";"))
+        for line in sections.get("THERMODYNAMIC DATA", [])
+        if not line.startswith("Reaction;")
+    ])
+    lines = [
+        "Reaction;Extended;Model dir;Data dir;Partial data;RHS;" + \
+        "delta r G Min;delta r G Max;"
+    ]
+    for i, rxn_id in enumerate(reaction_ids):
+        row = reported.get(
+            rxn_id, [rxn_id, equations[rxn_id], "0", "0", "0", "0"]
+        )
+        if equations[rxn_id].startswith("["):
+            interval = [format_value(drG_min[i]), format_value(drG_max[i])]
+        else:
+            interval = ["NaN", "NaN"]
+        lines.append(";".join(row[0:6] + interval + [""]))
+    return lines
+
+def test_thermodynamic_data_lines():
+    net_model_text = "\n".join([
+        "compartment;c;7.0;0;0;0.7;cytosol",
+        "reaction;R1;[c]C00092 = C00085;;;;",
+        "reaction;R2;[c]C00085 = C00354;;;;",
+        "reaction;T1;C00092[e] = C00092[c];;;;"
+    ])
+    net_output_text = "\n".join([
+        "CONCENTRATIONS",
+        "",
+        "Metabolite;DfG'0;Range Min;Range Max;Optim Min;Optim Max;",
+        "g6p + f6p;;0.432;0.528;0.432;0.528;",
+        "g6p[c];-1318.92;0.0001;10;1;1;",
+        "f6p[c];-1315.74;0.0001;10;0.1;0.2;",
+        "",
+        "THERMODYNAMIC DATA",
+        "",
+        "Reaction;Extended;Model dir;Data dir;Partial data;RHS;delta r G Min;delta r G Max;",
+        "R1;[c]g6p <==> f6p;0;1;0;0;-7;-5;"
+    ])
+    sections = net_output_sections(net_output_text)
+    bounds = run_concentration_bounds(
+        sections, {"g6p" : "C00092", "f6p" : "C00085"}
+    )
+    assert bounds == {"C00092[c]" : (1.0, 1.0), "C00085[c]" : (0.1, 0.2)}
+
+    # Standard energies of -1 and 0 kJ/mol, C00354 at default bounds
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    lo, hi = model_bounds(species, bounds, (0.001, 1))
+    dfG_prime = np.array([0.0, -1.0, -1.0, 0.0])
+    drG0, drG_min, drG_max = reaction_energy_bounds(
+        S, dfG_prime, lo[:, None], hi[:, None]
+    )
+    lines = thermodynamic_data_lines(
+        reaction_ids, reactions, drG_min[:, 0], drG_max[:, 0], sections
+    )
+    assert lines[1] == "R1;[c]g6p <==> f6p;0;1;0;0;-6.708;-4.9897;"
+    assert lines[2] == "R2;[c]C00085 = C00354;0;0;0;0;-13.1343;5.708;"
+    assert lines[3] == "T1;C00092[e] = C00092[c];0;0;0;0;NaN;NaN;"
+
+
+# Main code block
+
+def main(model, thermo, infiles, names, default_bounds, outfile_names):
+    if len(infiles) != len(outfile_names):
+        sys.exit("Error: Number of outfiles does not match number of files.")
+
+    # Read model and standard reaction energies
+    net_model_text = open_file(model).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+    net_kegg_dict = read_net_kegg_dict(names)
+
+    # Concentration bounds of all runs as columns, for one batched product
+    run_sections = []
+    lo = []
+    hi = []
+    for infile in infiles:
+        sections = net_output_sections(open_file(infile).read())
+        bounds = run_concentration_bounds(sections, net_kegg_dict)
+        unmapped = sorted(set(bounds) - set(species))
+        if unmapped:
+            print(
+                "Warning: " + infile + ": metabolites not in the model, " + \
+                "check the names file; default bounds are used for them: " + \
+                ", ".join(unmapped), file=sys.stderr
+            )
+        run_lo, run_hi = model_bounds(species, bounds, default_bounds)
+        run_sections.append(sections)
+        lo.append(run_lo)
+        hi.append(run_hi)
+    drG0, drG_min, drG_max = reaction_energy_bounds(
+        S, dfG_prime, np.column_stack(lo), np.column_stack(hi)
+    )
+
+    # Write one THERMODYNAMIC DATA table per run
+    for j, outfile_name in enumerate(outfile_names):
+        with open_file(outfile_name, 'w') as outfile:
+            outfile.write("\n".join(thermodynamic_data_lines(
+                reaction_ids, reactions, drG_min[:, j], drG_max[:, j],
+                run_sections[j]
+            )) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data, NET output files, names
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+    parser.add_argument(
+        'infiles', nargs='+',
+        help='Read NET output files.'
+    )
+    parser.add_argument(
+        '-n', '--names',
+        help='Read metabolite names-to-KEGG ID translation.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-d', '--default_bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Concentration bounds (mM) of metabolites not in the output ' + \
+        '[0.0001 10].'
+    )
+
+    # Output: Reaction energy tables
+    parser.add_argument(
+        '-o', '--outfiles', nargs='+', required=True,
+        help='Write THERMODYNAMIC DATA tables, one per NET output file.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.infiles, args.names,
+        args.default_bounds, args.outfiles
+    )
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from extract_concentrations import read_kegg_name_dict
+from match_reactions import read_net_reactions
+from netaid_io import open_file
+from reaction_energies import model_bounds, read_concentration_bounds, \
+    reaction_energy_bounds, species_formation_energies, stoichiometric_matrix
+from transform_thermo import R, T, read_compartments
+
+# Specify path to repository
+global repo_dir
+repo_dir = os.path.dirname(__file__)
+
+# Define functions
+def read_flux_directions(experimental_text):
+    # Flux directions given in the experimental file
+    directions = {}
+    for line in experimental_text.split("\n"):
+        if line.startswith("flux;"):
+            line = line.split(";")
+            directions[line[1]] = int(float(line[2]))
+    return directions
+
+def constraint_polytope(S, drG0, directions, ln_lo, ln_hi):
+    # Linear constraints A x <= b on the free log-concentrations (M): the
+    # concentration bounds, and d (drG0 + RT S^T x) <= 0 for every reaction
+    # with a direction d and a known standard reaction energy
+    free = ln_lo < ln_hi
+    x_fixed = np.where(free, 0.0, ln_lo)
+    n_free = np.count_nonzero(free)
+    constrained = np.flatnonzero((directions != 0) & np.isfinite(drG0))
+    A_rxn = (S[:, constrained].T.multiply(
+        (directions[constrained] * R * T)[:, None]
+    )).tocsr()
+    b_rxn = -directions[constrained] * drG0[constrained] - A_rxn @ x_fixed
+    A = np.vstack([
+        np.eye(n_free), -np.eye(n_free), A_rxn[:, free].toarray()
+    ])
+    b = np.concatenate([ln_hi[free], -ln_lo[free], b_rxn])
+    return (A, b, free, x_fixed)
+
+def test_constraint_polytope():
+    # A = B, with A between 1 and 10 mM, B between 0.1 and 10 mM, water fixed
+    S = sparse.csr_matrix(np.array([[-1.0], [1.0], [0.0]]))
+    drG0 = np.array([-5.0])
+    ln_lo = np.log(np.array([1.0, 0.1, 1000.0]) / 1000)
+    ln_hi = np.log(np.array([10.0, 10.0, 1000.0]) / 1000)
+    A, b, free, x_fixed = constraint_polytope(
+        S, drG0, np.array([1]), ln_lo, ln_hi
+    )
+    assert free.tolist() == [True, True, False]
+    assert A.shape == (5, 2)
+    assert np.allclose(A[4], [-R * T, R * T])
+    assert np.allclose(b[4], 5.0)
+
+
+def chebyshev_center(A, b):
+    # Centre of the largest ball inside the polytope, as a starting point
+    norms = np.linalg.norm(A, axis=1)
+    result = linprog(
+        np.r_[np.zeros(A.shape[1]), -1.0], A_ub=np.c_[A, norms], b_ub=b,
+        bounds=[(None, None)] * A.shape[1] + [(0, None)], method="highs"
+    )
+    if result.status != 0 or result.x[-1] <= 1e-9:
+        sys.exit("Error: Concentration space has no interior point.")
+    return result.x[:-1]
+
+def hit_and_run(A, b, x0, n_chains, n_steps, burn_in, thin, seed):
+    # Run all chains together; every step draws one direction per chain and
+    # a uniform point on the chord through the polytope
+    rng = np.random.default_rng(seed)
+    X = np.tile(x0, (n_chains, 1))
+    slack = b - X @ A.T
+    samples = []
+    for step in range(n_steps):
+        D = rng.standard_normal(X.shape)
+        D /= np.linalg.norm(D, axis=1)[:, None]
+        AD = D @ A.T
+        ratio = np.maximum(slack, 0) / np.where(AD == 0, np.nan, AD)
+        t_max = np.nanmin(np.where(AD > 0, ratio, np.inf), axis=1)
+        t_min = np.nanmax(np.where(AD < 0, ratio, -np.inf), axis=1)
+        t = t_min + (t_max - t_min) * rng.random(n_chains)
+        X += t[:, None] * D
+        slack -= t[:, None] * AD
+        if step >= burn_in and (step - burn_in) % thin == 0:
+            samples.append(X.copy())
+    return np.concatenate(samples) if samples else np.empty((0, X.shape[1]))
+
+def hit_and_run_star(args):
+    return hit_and_run(*args)
+
+def test_hit_and_run():
+    # Unit square with x0 + x1 <= 1
+    A = np.array([[1.0, 0.0], [0.0, 1.0], [-1.0, 0.0], [0.0, -1.0], [1.0, 1.0]])
+    b = np.array([1.0, 1.0, 0.0, 0.0, 1.0])
+    x0 = chebyshev_center(A, b)
+    samples = hit_and_run(A, b, x0, 50, 400, 100, 5, 1)
+    assert samples.shape == (50 * 60, 2)
+    assert np.all(samples @ A.T <= b + 1e-9)
+
+    # The mean of a uniform triangle is its centroid
+    assert np.allclose(samples.mean(axis=0), [1 / 3, 1 / 3], atol=0.03)
+
+
+def sample_polytope(A, b, n_chains, n_steps, burn_in, thin, seed, processes):
+    # Split chains over worker processes with independent random streams
+    x0 = chebyshev_center(A, b)
+    processes = processes or os.cpu_count()
+    blocks = [
+        len(x) for x in np.array_split(np.arange(n_chains), processes) if len(x)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    with ProcessPoolExecutor(max_workers=len(blocks)) as executor:
+        return np.concatenate(list(executor.map(hit_and_run_star, [
+            (A, b, x0, n, n_steps, burn_in, thin, s)
+            for n, s in zip(blocks, seeds)
+        ])))
+
+
+# Main code block
+
+def main(model, thermo, experimental, default_bounds, n_chains, n_steps,
+         burn_in, thin, quantiles, seed, processes, label, energies,
+         medians, outfile_name):
+
+    # Read model, thermodynamics, concentration bounds and directions
+    net_model_text = open_file(model).read()
+    experimental_text = open_file(experimental).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+    lo, hi = model_bounds(
+        species, read_concentration_bounds(experimental_text), default_bounds
+    )
+    drG0, drG_min, drG_max = reaction_energy_bounds(S, dfG_prime, lo, hi)
+    given = read_flux_directions(experimental_text)
+
+    # Energies of multi-compartment reactions lack the transported protons,
+    # so they are not used as constraints
+    directions = np.array([
+        given.get(rxn_id, 0) if reactions[rxn_id].startswith("[") else 0
+        for rxn_id in reaction_ids
+    ])
+
+    # Sample log-concentrations (M) and add back the fixed species
+    A, b, free, x_fixed = constraint_polytope(
+        S, drG0, directions, np.log(lo / 1000), np.log(hi / 1000)
+    )
+    free_samples = sample_polytope(
+        A, b, n_chains, n_steps, burn_in, thin, seed, processes
+    )
+    samples = np.tile(x_fixed, (len(free_samples), 1))
+    samples[:, free] = free_samples
+    q = [quantiles[0], 0.5, quantiles[1]]
+    conc_q = np.quantile(np.exp(samples) * 1000, q, axis=0)
+
+    # Write concentration quantiles (mM) in the extract_concentrations layout
+    kegg_name_dict = read_kegg_name_dict(
+        os.path.join(repo_dir, "data/keggid_keggname.tab")
+    )
+    order = sorted(range(len(species)), key = lambda i: species[i])
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join([
+            "Label", "ID", "Name", "Compartment", "KEGGID",
+            "LowIn", "HighIn", "LowOut", "HighOut"
+        ]) + "\n")
+        for i in order:
+            kegg_id, compartment = species[i].rstrip("]").split("[")
+            outfile.write("\t".join([
+                label, kegg_id, kegg_name_dict.get(kegg_id, "NA"), compartment,
+                kegg_id
+            ] + [
+                "%.6g" % x for x in (lo[i], hi[i], conc_q[0][i], conc_q[2][i])
+            ]) + "\n")
+
+    # Write median concentrations (mM)
+    if medians:
+        with open_file(medians, 'w') as outfile:
+            outfile.write("\t".join(
+                ["Label", "ID", "Compartment", "KEGGID", "Median"]
+            ) + "\n")
+            for i in order:
+                kegg_id, compartment = species[i].rstrip("]").split("[")
+                outfile.write("\t".join([
+                    label, kegg_id, compartment, kegg_id, "%.6g" % conc_q[1][i]
+                ]) + "\n")
+
+    # Write reaction energy quantiles next to the bounds-only intervals
+    if energies:
+        drG_q = np.quantile(
+            drG0 + R * T * (S.T @ samples.T).T, q, axis=0
+        )
+        with open_file(energies, 'w') as outfile:
+            outfile.write("\t".join([
+                "Label", "ID", "Direction", "LowIn", "HighIn",
+                "LowOut", "HighOut", "Median"
+            ]) + "\n")
+            for i, rxn_id in enumerate(reaction_ids):
+                outfile.write("\t".join([
+                    label, rxn_id, str(directions[i])
+                ] + [
+                    str(round(x, 4)) for x in
+                    (drG_min[i], drG_max[i], drG_q[0][i], drG_q[2][i],
+                     drG_q[1][i])
+                ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data, experimental data
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+    parser.add_argument(
+        '-x', '--experimental', required=True,
+        help='Read experimental data file with bounds and flux directions.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-d', '--default_bounds', type=float, nargs=2, default=[0.0001, 10],
+        help='Concentration bounds (mM) of unmeasured metabolites [0.0001 10].'
+    )
+    parser.add_argument(
+        '-n', '--chains', type=int, default=64,
+        help='Number of hit-and-run chains [64].'
+    )
+    parser.add_argument(
+        '-s', '--steps', type=int, default=2000,
+        help='Number of steps per chain [2000].'
+    )
+    parser.add_argument(
+        '-b', '--burn_in', type=int, default=1000,
+        help='Number of steps discarded at the start of each chain [1000].'
+    )
+    parser.add_argument(
+        '-k', '--thin', type=int, default=10,
+        help='Keep every k-th step after burn-in [10].'
+    )
+    parser.add_argument(
+        '-q', '--quantiles', type=float, nargs=2, default=[0.025, 0.975],
+        help='Lower and upper quantile written as range [0.025 0.975].'
+    )
+    parser.add_argument(
+        '-r', '--seed', type=int, default=None,
+        help='Seed for the random number generator.'
+    )
+    parser.add_argument(
+        '-p', '--processes', type=int, default=None,
+        help='Number of worker processes [all CPUs].'
+    )
+    parser.add_argument(
+        '-l', '--label', default="Sampled",
+        help='Label for dataset [Sampled].'
+    )
+
+    # Output: Concentration and reaction energy quantiles, medians
+    parser.add_argument(
+        '-e', '--medians',
+        help='Write tab-delimited median concentrations.'
+    )
+    parser.add_argument(
+        '-g', '--energies',
+        help='Write tab-delimited reaction energy quantiles.'
+    )
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write concentration quantiles to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.experimental, args.default_bounds,
+        args.chains, args.steps, args.burn_in, args.thin, args.quantiles,
+        args.seed, args.processes, args.label, args.energies, args.medians,
+        args.outfile
+    )
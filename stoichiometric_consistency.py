@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import sys
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import open_file
+from reaction_energies import stoichiometric_matrix
+
+# Define functions
+def mass_reactions(reactions):
+    # Reactions with both substrates and products; exchange reactions and
+    # the biomass reaction do not conserve mass by design
+    kept = {}
+    for rxn_id in reactions:
+        if rxn_id == "Biomass" or not reactions[rxn_id]:
+            continue
+        coefficients = reaction_stoichiometry(reactions[rxn_id]).values()
+        if min(coefficients, default=0) < 0 < max(coefficients, default=0):
+            kept[rxn_id] = reactions[rxn_id]
+    return kept
+
+def conserved_masses(S):
+    # One LP: maximize the number of species with positive mass m, with
+    # S^T m = 0 and m >= z, 0 <= z <= 1; the model is consistent if every
+    # species can have a positive mass
+    n_species = S.shape[0]
+    identity = sparse.identity(n_species, format="csr")
+    result = linprog(
+        np.concatenate([np.zeros(n_species), -np.ones(n_species)]),
+        A_ub=sparse.hstack([-identity, identity]),
+        b_ub=np.zeros(n_species),
+        A_eq=sparse.hstack([S.T, sparse.csr_matrix(S.T.shape)]),
+        b_eq=np.zeros(S.shape[1]),
+        bounds=[(0, None)] * n_species + [(0, 1)] * n_species,
+        method="highs"
+    )
+    if result.status != 0:
+        sys.exit("Error: Consistency LP failed: " + result.message)
+    masses = result.x[:n_species]
+    return (masses, result.x[n_species:] > 1 - 1e-6)
+
+def leak_combination(S, targets, columns, time_limit):
+    # Smallest (L1) combination v of the given reaction columns with S v >= 0
+    # and at least one unit of the target species made, i.e. reactions that
+    # together make target species from nothing. The L1 norm keeps the
+    # reaction set small without a mixed-integer search for the smallest one
+    S_sub = S[:, columns]
+    n_columns = len(columns)
+    made = sparse.csr_matrix(S_sub[targets].sum(axis=0))
+    A_ub = sparse.vstack([
+        sparse.hstack([-S_sub, S_sub]), sparse.hstack([-made, made])
+    ])
+    b_ub = np.zeros(S.shape[0] + 1)
+    b_ub[-1] = -1
+    result = linprog(
+        np.ones(2 * n_columns), A_ub=A_ub, b_ub=b_ub, bounds=(0, None),
+        method="highs", options={"time_limit" : max(time_limit, 0.1)}
+    )
+    if result.status != 0:
+        return None
+    v = np.zeros(S.shape[1])
+    v[columns] = result.x[:n_columns] - result.x[n_columns:]
+    v[np.abs(v) < 1e-9] = 0
+    return v
+
+def inconsistent_sets(S, conserved, max_sets, time_budget):
+    # Up to max_sets reaction sets that make unexplained unconserved species
+    # from nothing, within the time budget. Each search starts from the
+    # reactions with unexplained species and widens to reactions sharing
+    # species with them until a set is found, so that sets stay local
+    start = time.time()
+    sets = []
+    covered = conserved.copy()
+    S = sparse.csc_matrix(S)
+    incidence = (S != 0).astype(int)
+    while len(sets) < max_sets and not covered.all():
+        targets = np.flatnonzero(~covered)
+        columns = np.flatnonzero(incidence[targets].sum(axis=0))
+        v = None
+        while v is None:
+            remaining = time_budget - (time.time() - start)
+            if remaining <= 0:
+                return sets
+            v = leak_combination(S, targets, columns, remaining)
+            if v is not None or len(columns) == S.shape[1]:
+                break
+            species = np.flatnonzero(incidence[:, columns].sum(axis=1))
+            columns = np.flatnonzero(incidence[species].sum(axis=0))
+        if v is None:
+            break
+        leak = S @ v
+        covered[leak > 1e-9] = True
+        sets.append((v, leak))
+    return sets
+
+def test_inconsistent_sets():
+    reactions = mass_reactions({
+        "R1" : "[c]C00022 = C00024",
+        "R2" : "[c]C00024 = C00033",
+        "R3" : "[c]C00033 = C00022 + C00080",
+        "R4" : "[c]C00092 = C00085",
+        "R5" : "[c]C00022 + C00024 = C00085",
+        "EX" : "[c]C00092 = ",
+        "Biomass" : "C00024 = C00033"
+    })
+    assert sorted(reactions) == ["R1", "R2", "R3", "R4", "R5"]
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    masses, conserved = conserved_masses(S)
+    assert dict(zip(species, conserved)) == {
+        "C00022[c]" : True, "C00024[c]" : True, "C00033[c]" : True,
+        "C00080[c]" : False, "C00092[c]" : True, "C00085[c]" : True
+    }
+    assert np.allclose(S.T @ masses, 0)
+
+    # R3 alone can not make protons, so the search widens to R1 and R2;
+    # R4 and R5 are not needed
+    sets = inconsistent_sets(S, conserved, 10, 10)
+    assert len(sets) == 1
+    v, leak = sets[0]
+    assert [reaction_ids[j] for j in np.flatnonzero(v)] == ["R1", "R2", "R3"]
+    assert [species[i] for i in np.flatnonzero(leak)] == ["C00080[c]"]
+
+    # No time, no sets
+    assert inconsistent_sets(S, conserved, 10, 0) == []
+
+    # A balanced model is consistent
+    masses, conserved = conserved_masses(S[:, :2])
+    assert conserved.all()
+
+
+def combination_text(values, scale, names):
+    # Nonzero values divided by the scale as a NET formatted combination,
+    # e.g. (2) R1 + (-1) R2, with integers where possible
+    terms = []
+    for j in sorted(np.flatnonzero(np.abs(values) > 1e-9), key=lambda j: names[j]):
+        coefficient = round(values[j] / scale, 4)
+        if coefficient == int(coefficient):
+            coefficient = int(coefficient)
+        if coefficient == 1:
+            terms.append(names[j])
+        else:
+            terms.append("(" + str(coefficient) + ") " + names[j])
+    return " + ".join(terms)
+
+def test_combination_text():
+    assert combination_text(np.array([2, 0, -1, 1]), 1, ["R2", "R3", "R1", "A"]) \
+        == "A + (-1) R1 + (2) R2"
+    assert combination_text(np.array([1.5, 3]), 1.5, ["C00080[c]", "C00001[c]"]) \
+        == "(2) C00001[c] + C00080[c]"
+
+
+# Main code block
+
+def main(model, max_sets, time_budget, outfile_name):
+    reactions = read_net_reactions(open_file(model).readlines(), False)
+    species, reaction_ids, S = stoichiometric_matrix(mass_reactions(reactions))
+
+    masses, conserved = conserved_masses(S)
+    sets = inconsistent_sets(S, conserved, max_sets, time_budget)
+    covered = conserved.copy()
+    for v, leak in sets:
+        covered[leak > 1e-9] = True
+    status = "consistent" if conserved.all() else "inconsistent"
+
+    # Write status, masses and inconsistent reaction sets
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("Status\t" + status + "\n")
+        outfile.write("Species\t" + str(len(species)) + "\n")
+        outfile.write(
+            "Unconserved\t" + str(np.count_nonzero(~conserved)) + "\n"
+        )
+        outfile.write(
+            "Unexplained\t" + str(np.count_nonzero(~covered)) + "\n"
+        )
+        outfile.write("\n")
+        outfile.write("\t".join(
+            ["KEGGID", "Compartment", "Mass", "Conserved"]
+        ) + "\n")
+        for i, metabolite in enumerate(species):
+            kegg_id, compartment = metabolite.rstrip("]").split("[")
+            outfile.write("\t".join([
+                kegg_id, compartment, str(abs(round(masses[i], 4))),
+                str(int(conserved[i]))
+            ]) + "\n")
+        outfile.write("\n")
+        outfile.write("\t".join(
+            ["Set", "Size", "Combination", "Net"]
+        ) + "\n")
+        for i, (v, leak) in enumerate(sets):
+            # Smallest reaction coefficient of one
+            scale = np.min(np.abs(v[v != 0]))
+            outfile.write("\t".join([
+                str(i + 1), str(np.count_nonzero(v)),
+                combination_text(v, scale, reaction_ids),
+                combination_text(leak, scale, species)
+            ]) + "\n")
+
+    # Fail model builds with inconsistent models
+    if status == "inconsistent":
+        sys.exit(
+            "Error: Model is stoichiometrically inconsistent; " + \
+            str(np.count_nonzero(~conserved)) + " species can not be conserved."
+        )
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model
+    parser.add_argument(
+        'model',
+        help='Read NET model file.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-n', '--max_sets', type=int, default=3,
+        help='Maximum number of inconsistent reaction sets to isolate [3].'
+    )
+    parser.add_argument(
+        '-s', '--seconds', type=float, default=10.0,
+        help='Time budget for isolating reaction sets in seconds [10].'
+    )
+
+    # Output: Consistency report
+    parser.add_argument(
+        'outfile',
+        help='Write stoichiometric consistency report to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.model, args.max_sets, args.seconds, args.outfile)
@@ -3,20 +3,39 @@
 # Import modules
 import argparse
 
+from netaid_io import open_file
+
 # Define functions
+def cc_columns(header_line):
+    # Column positions in a component-contribution csv file; the standard
+    # error of dG0_f is optional and may also be called "uncertainty"
+    header = [x.strip() for x in header_line.split(",")]
+    columns = {
+        "Compound ID" : 0, "nH" : 1, "charge" : 2, "dG0_f" : 3,
+        "dG0_f_std" : None
+    }
+    for name in columns:
+        if name in header:
+            columns[name] = header.index(name)
+    if columns["dG0_f_std"] is None and "uncertainty" in header:
+        columns["dG0_f_std"] = header.index("uncertainty")
+    return columns
+
 def format_thermo_lines(thermo_lines):
 
     # Create dictionary by metabolite
     thermo_lines_dict = {}
+    columns = cc_columns("")
     for line in thermo_lines:
         line = line.strip()
-        if line.endswith("nan"):
-            # Skip lines without a formation delta G
-            continue
         if line.startswith("Compound ID"):
-            # Skip header line
+            # Read column positions from header line
+            columns = cc_columns(line)
             continue
-        metabolite = line.split(",")[0]
+        if line.split(",")[columns["dG0_f"]] == "nan":
+            # Skip lines without a formation delta G
+            continue
+        metabolite = line.split(",")[columns["Compound ID"]]
         try:
             thermo_lines_dict[metabolite].append(line)
         except KeyError:
@@ -28,10 +47,15 @@ def format_thermo_lines(thermo_lines):
         met_section = [metabolite + ";;;;;;"]
         for met_line in thermo_lines_dict[metabolite]:
             met_line = met_line.split(",")
-            dfG = met_line[3]
-            chrg = met_line[2]
-            nH = met_line[1]
-            met_section.append(";".join(["", dfG, "NaN", chrg, nH, "", ""]))
+            dfG = met_line[columns["dG0_f"]]
+            chrg = met_line[columns["charge"]]
+            nH = met_line[columns["nH"]]
+            if columns["dG0_f_std"] is None or \
+                met_line[columns["dG0_f_std"]] in ("", "nan"):
+                std = "NaN"
+            else:
+                std = met_line[columns["dG0_f_std"]]
+            met_section.append(";".join(["", dfG, std, chrg, nH, "", ""]))
         net_thermo_lines.append("\n".join(met_section) + "\n")
 
     return net_thermo_lines
@@ -74,13 +98,34 @@ def test_format_thermo_lines():
     ]
     assert format_thermo_lines(input_thermo_lines) == output_thermo_lines
 
+def test_format_thermo_lines_std():
+    input_thermo_lines = [
+        "Compound ID,nH,charge,dG0_f,dG0_f_std\n",
+        "C00008,14,-1,-1974.33,1.5\n",
+        "C00008,15,0,-1992.59,1.5\n",
+        "C00012,0,0,nan,nan\n",
+        "C00013,2,-2,-1971.3,nan\n"
+    ]
+    output_thermo_lines = [
+        "\n".join([
+            "C00008;;;;;;",
+            ";-1974.33;1.5;-1;14;;",
+            ";-1992.59;1.5;0;15;;"
+        ]) + "\n",
+        "\n".join([
+            "C00013;;;;;;",
+            ";-1971.3;NaN;-2;2;;"
+        ]) + "\n"
+    ]
+    assert format_thermo_lines(input_thermo_lines) == output_thermo_lines
+
 
 # Main code block
 
 def main(cc_thermo_filename, net_thermo_filename):
-    with open(net_thermo_filename, 'w') as outfile:
+    with open_file(net_thermo_filename, 'w') as outfile:
         outfile.write(
-            "".join(format_thermo_lines(open(cc_thermo_filename).readlines()))
+            "".join(format_thermo_lines(open_file(cc_thermo_filename).readlines()))
         )
 
 if __name__ == "__main__":
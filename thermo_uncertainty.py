@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+import sys
+
+import numpy as np
+from scipy import sparse
+
+import thermo_format
+from match_reactions import read_net_reactions
+from netaid_io import open_file
+from reaction_energies import species_formation_energies, stoichiometric_matrix
+from transform_thermo import read_compartments
+
+# Define functions
+def read_uncertainties(thermo_lines):
+    # Standard error of dfG by KEGG ID from a NET thermo file or a CC csv
+    # file; the pseudoisomers of one compound share the error
+    thermo_lines = [line.strip() for line in thermo_lines if line.strip()]
+    if thermo_lines and thermo_lines[0].startswith("Compound ID"):
+        thermo_lines = "".join(
+            thermo_format.format_thermo_lines(thermo_lines)
+        ).split("\n")
+    uncertainties = {}
+    metabolite = None
+    for line in thermo_lines:
+        if not line:
+            continue
+        line = line.split(";")
+        if line[0]:
+            metabolite = line[0]
+            continue
+        std = float(line[2])
+        if np.isnan(std):
+            continue
+        uncertainties[metabolite] = max(uncertainties.get(metabolite, 0), std)
+    return uncertainties
+
+def test_read_uncertainties():
+    net_thermo_lines = [
+        "C00008;;;;;;\n",
+        ";-1974.33;1.5;-1;14;;\n",
+        ";-1992.59;1.5;0;15;;\n",
+        "C00009;;;;;;\n",
+        ";-1020.02;NaN;-3;0;;\n"
+    ]
+    cc_thermo_lines = [
+        "Compound ID,nH,charge,dG0_f,dG0_f_std\n",
+        "C00008,14,-1,-1974.33,1.5\n",
+        "C00008,15,0,-1992.59,1.5\n",
+        "C00009,0,-3,-1020.02,nan\n"
+    ]
+    for thermo_lines in (net_thermo_lines, cc_thermo_lines):
+        assert read_uncertainties(thermo_lines) == {"C00008" : 1.5}
+
+
+def read_covariance(covariance_lines):
+    # Square csv matrix with a "Compound ID" header row and first column
+    header = covariance_lines[0].strip().split(",")[1:]
+    covariance = np.array([
+        [float(x) for x in line.strip().split(",")[1:]]
+        for line in covariance_lines[1:] if line.strip()
+    ])
+    if covariance.shape != (len(header), len(header)):
+        sys.exit("Error: Covariance matrix is not square.")
+    return (header, covariance)
+
+def compound_covariance(compounds, uncertainties, covariance=None):
+    # Covariance of dfG over the compounds; given covariance entries take
+    # precedence over the standard errors, unknown errors count as zero
+    sigma = np.diag([uncertainties.get(c, 0.0) ** 2 for c in compounds])
+    if covariance:
+        header, matrix = covariance
+        index = dict([(c, i) for i, c in enumerate(compounds)])
+        rows = [i for i, c in enumerate(header) if c in index]
+        target = [index[header[i]] for i in rows]
+        sigma[np.ix_(target, target)] = matrix[np.ix_(rows, rows)]
+    return sigma
+
+def draw_errors(sigma, n_draws, seed):
+    # Correlated normal errors from the eigendecomposition, which also works
+    # for the rank-deficient covariance matrices of component contribution
+    eigenvalues, eigenvectors = np.linalg.eigh(sigma)
+    L = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n_draws, len(sigma))) @ L.T
+
+def reaction_energy_samples(S, species, dfG_prime, errors, compounds):
+    # Standard transformed reaction energies of all draws in one product
+    index = dict([(c, i) for i, c in enumerate(compounds)])
+    P = sparse.csr_matrix((
+        np.ones(len(species)),
+        ([index[m.split("[")[0]] for m in species], np.arange(len(species)))
+    ), shape=(len(compounds), len(species)))
+    return (S.T @ dfG_prime) + errors @ (P @ S)
+
+def test_reaction_energy_samples():
+    # A[c] = B[c] and A[e] = A[c]; A and B share a fully correlated error
+    species = ["A[c]", "B[c]", "A[e]"]
+    S = sparse.csr_matrix(np.array([[-1.0, 1.0], [1.0, 0.0], [0.0, -1.0]]))
+    dfG_prime = np.array([-10.0, -15.0, -12.0])
+    compounds = ["A", "B"]
+    sigma = compound_covariance(
+        compounds, {"A" : 2.0}, (["A", "B"], np.array([[4.0, 4.0], [4.0, 4.0]]))
+    )
+    errors = draw_errors(sigma, 5000, 1)
+    samples = reaction_energy_samples(S, species, dfG_prime, errors, compounds)
+    assert samples.shape == (5000, 2)
+
+    # Errors cancel in both reactions
+    assert np.allclose(samples, [-5.0, 2.0])
+
+    # Independent errors add up in A = B
+    sigma = compound_covariance(compounds, {"A" : 3.0, "B" : 4.0})
+    samples = reaction_energy_samples(
+        S, species, dfG_prime, draw_errors(sigma, 20000, 1), compounds
+    )
+    assert abs(samples[:, 0].std() - 5.0) < 0.1
+    assert np.allclose(samples[:, 1], 2.0)
+
+
+# Main code block
+
+def main(model, thermo, covariance_file, n_draws, level, seed, outfile_name):
+
+    # Read model and transformed formation energies
+    net_model_text = open_file(model).read()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    species, reaction_ids, S = stoichiometric_matrix(reactions)
+    dfG_prime = species_formation_energies(
+        species, thermo, read_compartments(net_model_text)
+    )
+
+    # Draw correlated formation energy errors by compound
+    compounds = sorted(set([m.split("[")[0] for m in species]))
+    covariance = None
+    if covariance_file:
+        covariance = read_covariance(open_file(covariance_file).readlines())
+    sigma = compound_covariance(
+        compounds, read_uncertainties(open_file(thermo).readlines()), covariance
+    )
+    errors = draw_errors(sigma, n_draws, seed)
+    drG0 = S.T @ dfG_prime
+    samples = reaction_energy_samples(S, species, dfG_prime, errors, compounds)
+    low, high = np.quantile(
+        samples, [(1 - level) / 2, (1 + level) / 2], axis=0
+    )
+
+    # Write standard reaction energies with confidence intervals
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join(
+            ["ID", "drG0_prime", "SD", "Low", "High"]
+        ) + "\n")
+        for i, rxn_id in enumerate(reaction_ids):
+            outfile.write("\t".join([rxn_id] + [
+                str(round(x, 4)) for x in
+                (drG0[i], samples[:, i].std(), low[i], high[i])
+            ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model, thermodynamics data with standard errors, covariance
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file with dfG standard errors.'
+    )
+    parser.add_argument(
+        '-c', '--covariance',
+        help='Read csv dfG covariance matrix by Compound ID.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-n', '--draws', type=int, default=10000,
+        help='Number of Monte Carlo draws [10000].'
+    )
+    parser.add_argument(
+        '-l', '--level', type=float, default=0.95,
+        help='Confidence level [0.95].'
+    )
+    parser.add_argument(
+        '-r', '--seed', type=int, default=None,
+        help='Seed for the random number generator.'
+    )
+
+    # Output: Tab-delimited reaction energy confidence intervals
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write drG0 prime confidence intervals to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(
+        args.model, args.thermo, args.covariance, args.draws, args.level,
+        args.seed, args.outfile
+    )
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+# Import modules
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+import thermo_format
+from match_reactions import read_net_reactions, reaction_stoichiometry
+from netaid_io import file_signature, open_file
+
+# Physical constants (kJ/mol, K) and extended Debye-Hückel parameters
+global R, T, DH_A, DH_B
+R = 8.31446e-3
+T = 298.15
+DH_A = 2.91482
+DH_B = 1.6
+
+# Define functions
+def read_pseudoisomers(thermo_lines):
+    # Accept component-contribution csv files as well as NET thermo files
+    thermo_lines = [line.strip() for line in thermo_lines if line.strip()]
+    if thermo_lines and thermo_lines[0].startswith("Compound ID"):
+        thermo_lines = "".join(
+            thermo_format.format_thermo_lines(thermo_lines)
+        ).split("\n")
+
+    # Collect pseudoisomers as parallel lists with a metabolite index;
+    # metabolites without pseudoisomers are left out, so that every
+    # metabolite has a group
+    metabolites = []
+    dfG = []
+    charge = []
+    nH = []
+    group = []
+    def drop_empty():
+        if metabolites and (not group or group[-1] != len(metabolites) - 1):
+            metabolites.pop()
+    for line in thermo_lines:
+        if not line:
+            continue
+        line = line.split(";")
+        if line[0]:
+            drop_empty()
+            metabolites.append(line[0])
+            continue
+        dfG.append(float(line[1]))
+        charge.append(float(line[3]))
+        nH.append(float(line[4]))
+        group.append(len(metabolites) - 1)
+    drop_empty()
+    return (
+        metabolites, np.array(dfG), np.array(charge), np.array(nH),
+        np.array(group, dtype=int)
+    )
+
+def test_read_pseudoisomers():
+    net_thermo_lines = [
+        "C00008;;;;;;\n",
+        ";-1974.33;NaN;-1;14;;\n",
+        ";-1992.59;NaN;0;15;;\n",
+        "C00009;;;;;;\n",
+        ";-1020.02;NaN;-3;0;;\n"
+    ]
+    cc_thermo_lines = [
+        "Compound ID,nH,charge,dG0_f\n",
+        "C00008,14,-1,-1974.33\n",
+        "C00008,15,0,-1992.59\n",
+        "C00009,0,-3,-1020.02\n",
+        "C00012,0,0,nan\n"
+    ]
+    for thermo_lines in (net_thermo_lines, cc_thermo_lines):
+        metabolites, dfG, charge, nH, group = read_pseudoisomers(thermo_lines)
+        assert metabolites == ["C00008", "C00009"]
+        assert list(dfG) == [-1974.33, -1992.59, -1020.02]
+        assert list(charge) == [-1, 0, -3]
+        assert list(nH) == [14, 15, 0]
+        assert list(group) == [0, 0, 1]
+
+    # A metabolite without pseudoisomers does not shift later energies
+    pseudoisomers = read_pseudoisomers([
+        "C00001;;;;;;", ";-237.19;NaN;0;2;;", "C00002;;;;;;",
+        "C00009;;;;;;", ";-1096.1;NaN;-2;1;;", "C00012;;;;;;"
+    ])
+    assert pseudoisomers[0] == ["C00001", "C00009"]
+    assert list(pseudoisomers[4]) == [0, 1]
+    dfG_prime = transform_pseudoisomers(pseudoisomers, 0, 0)[0]
+    assert np.allclose(dfG_prime, [-237.19, -1096.1])
+
+
+def transform_pseudoisomers(pseudoisomers, pH, IS):
+    # Transformed formation energy of each pseudoisomer group (Alberty),
+    # for one or several pH/IS pairs at once (one row per pair)
+    metabolites, dfG, charge, nH, group = pseudoisomers
+    pH = np.atleast_1d(np.asarray(pH, dtype=float))[:, None]
+    sqrt_IS = np.sqrt(np.atleast_1d(np.asarray(IS, dtype=float)))[:, None]
+    dfG_prime = dfG + nH * R * T * np.log(10) * pH - \
+        DH_A * (charge ** 2 - nH) * sqrt_IS / (1 + DH_B * sqrt_IS)
+
+    # Combine pseudoisomers: -RT ln sum exp(-dfG'/RT), shifted by the group
+    # minimum for numerical stability
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    minimum = np.minimum.reduceat(dfG_prime, starts, axis=1)
+    shifted = np.exp(-(dfG_prime - np.repeat(
+        minimum, np.diff(np.r_[starts, len(group)]), axis=1
+    )) / (R * T))
+    return minimum - R * T * np.log(np.add.reduceat(shifted, starts, axis=1))
+
+def test_transform_pseudoisomers():
+    pseudoisomers = read_pseudoisomers([
+        "C00001;;;;;;", ";-237.19;NaN;0;2;;",
+        "C00009;;;;;;", ";-1096.1;NaN;-2;1;;", ";-1137.3;NaN;-1;2;;"
+    ])
+    dfG_prime = transform_pseudoisomers(pseudoisomers, [7.0, 7.5], [0.0, 0.1])
+
+    # Reference values from a plain loop over pseudoisomers
+    RT = R * T
+    for row, (pH, IS) in enumerate([(7.0, 0.0), (7.5, 0.1)]):
+        dh = DH_A * np.sqrt(IS) / (1 + DH_B * np.sqrt(IS))
+        water = -237.19 + 2 * RT * np.log(10) * pH - dh * (0 - 2)
+        pi = [
+            -1096.1 + 1 * RT * np.log(10) * pH - dh * (4 - 1),
+            -1137.3 + 2 * RT * np.log(10) * pH - dh * (1 - 2)
+        ]
+        pi = -RT * np.log(sum([np.exp(-g / RT) for g in pi]))
+        assert np.allclose(dfG_prime[row], [water, pi])
+
+
+@lru_cache(maxsize=16)
+def cached_pseudoisomers(signature):
+    return read_pseudoisomers(open_file(signature[0]).readlines())
+
+@lru_cache(maxsize=1024)
+def cached_transform(signature, pH, IS):
+    dfG_prime = transform_pseudoisomers(
+        cached_pseudoisomers(signature), pH, IS
+    )[0]
+    dfG_prime.setflags(write=False)
+    return dfG_prime
+
+def formation_energies(thermo, pH, IS):
+    # Transformed formation energies by KEGG ID, computed once per
+    # (thermo source, pH, IS) and reused afterwards
+    signature = file_signature(thermo)
+    metabolites = cached_pseudoisomers(signature)[0]
+    return dict(zip(metabolites, cached_transform(signature, pH, IS)))
+
+def read_compartments(net_model_text):
+    # Read pH and ionic strength by compartment from the NET model
+    compartments = {}
+    for line in net_model_text.split("\n"):
+        if line.startswith("compartment;"):
+            line = line.split(";")
+            compartments[line[1]] = (float(line[2]), float(line[3]))
+    return compartments
+
+def test_read_compartments():
+    net_model_text = "\n".join([
+        ";ID;pH;IS;Potential mV;Volume;",
+        "compartment;c;7.4;0.1;0;0.709;cytosol",
+        "compartment;e;7.8;0.2;0;0;extracellular",
+        "",
+        ";Model;;;;;",
+        "reaction;R1;[c]C00002 = C00008;;;;"
+    ])
+    assert read_compartments(net_model_text) == \
+        {"c" : (7.4, 0.1), "e" : (7.8, 0.2)}
+
+
+def model_species(net_model_text):
+    # Metabolites by compartment that occur in the model reactions
+    species = set()
+    reactions = read_net_reactions(net_model_text.split("\n"), False)
+    for rxn_id in reactions:
+        if rxn_id == "Biomass":
+            continue
+        for metabolite in reaction_stoichiometry(reactions[rxn_id]):
+            kegg_id, compartment = metabolite.rstrip("]").split("[")
+            species.add((kegg_id, compartment))
+    return species
+
+
+# Main code block
+
+def main(model, thermo, ph_grid, outfile_name):
+    net_model_text = open_file(model).read()
+    compartments = read_compartments(net_model_text)
+    species = model_species(net_model_text)
+
+    with open_file(outfile_name, 'w') as outfile:
+        outfile.write("\t".join(
+            ["KEGG.ID", "Compartment", "pH", "IS", "dfG_prime"]
+        ) + "\n")
+        for compartment in sorted(compartments):
+            pH, IS = compartments[compartment]
+            for scenario_pH in (ph_grid or [pH]):
+                dfG_prime = formation_energies(thermo, scenario_pH, IS)
+                for kegg_id, cm in sorted(species):
+                    if cm != compartment or kegg_id not in dfG_prime:
+                        continue
+                    outfile.write("\t".join([
+                        kegg_id, compartment, str(scenario_pH), str(IS),
+                        str(round(dfG_prime[kegg_id], 4))
+                    ]) + "\n")
+
+if __name__ == "__main__":
+
+    # Read arguments from the commandline
+    parser = argparse.ArgumentParser()
+
+    # Input: NET model with compartments, thermodynamics data
+    parser.add_argument(
+        '-m', '--model', required=True,
+        help='Read NET model file.'
+    )
+    parser.add_argument(
+        '-t', '--thermo', required=True,
+        help='Read NET or CC thermo file.'
+    )
+
+    # Options
+    parser.add_argument(
+        '-p', '--ph', type=float, nargs='+',
+        help='pH values to use instead of the compartment pH.'
+    )
+
+    # Output: Tab-delimited file with transformed formation energies
+    parser.add_argument(
+        '-o', '--outfile', required=True,
+        help='Write transformed formation energies to outfile.'
+    )
+
+    args = parser.parse_args()
+
+    # Run main function
+    main(args.model, args.thermo, args.ph, args.outfile)